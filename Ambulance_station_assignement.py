@@ -1,7 +1,11 @@
+import argparse
 import networkx as nx
 from create_graph import recreate_graph_from_file
+from routing import Router, ENGINES
+from voronoi import VoronoiPartition
+from station_mapping import save_station_mapping
 
-def assign_stations_to_hospitals(graph):
+def assign_stations_to_hospitals(graph, engine=None, hierarchy=None, cache=None, partition=None):
     assignments = {}
     travel_times = {}  # Store travel times from stations to hospitals
     travel_paths = {}
@@ -9,6 +13,33 @@ def assign_stations_to_hospitals(graph):
     stations = [node for node in graph.nodes if node.startswith('A')]  # Assuming stations start with 'A'
     hospitals = [node for node in graph.nodes if node.startswith('H')]
 
+    if cache is not None:
+        # Closest station per hospital from the persistent hospital trees (distance_cache.py)
+        trees = cache.trees('hospitals', hospitals)
+        distances = trees.distance_matrix(stations)
+        for k, hospital in enumerate(hospitals):
+            if stations and distances[k].min() < float('inf'):
+                closest_station = stations[int(distances[k].argmin())]
+                assignments[hospital] = closest_station
+                travel_times[(closest_station, hospital)] = float(distances[k].min())
+                travel_paths[(hospital, closest_station)] = trees.path(hospital, closest_station)
+        return assignments, travel_times, travel_paths
+
+    if engine is None:
+        # One multi-source Dijkstra seeded from every station: nearest station, travel time
+        # and path (hospital first) for every node at once. Pass a VoronoiPartition to reuse one.
+        if partition is None:
+            partition = VoronoiPartition(graph, stations)
+        for hospital in hospitals:
+            closest_station = partition.owner.get(hospital)
+            if closest_station is not None:
+                assignments[hospital] = closest_station
+                travel_times[(closest_station, hospital)] = partition.distance[hospital]
+                travel_paths[(hospital, closest_station)] = partition.path(hospital)
+        return assignments, travel_times, travel_paths
+
+    router = Router(graph, engine=engine, hierarchy=hierarchy)
+
     # Compute shortest paths from stations to hospitals
     for hospital in hospitals:
         shortest_path_length = float('inf')
@@ -16,9 +47,8 @@ def assign_stations_to_hospitals(graph):
         best_path = None
         for station in stations:
             try:
-                # Compute the shortest path length to each station
-                path_length = nx.shortest_path_length(graph, station, hospital, weight='weight')
-                path = nx.shortest_path(graph, hospital, station, weight='weight')
+                # One search gives both the travel time and the path to each station
+                path_length, path = router.shortest_path(hospital, station)
                 if path_length < shortest_path_length:
                     shortest_path_length = path_length
                     closest_station = station
@@ -40,15 +70,40 @@ def save_assignments_to_file(assignments, travel_times, travel_paths, file_path)
             f.write(f"{hospital} assigned to {station}, Travel Time: {travel_times[(station, hospital)]}, path: {travel_paths[(hospital,station)]}\n")
 
 
-file_path = 'graph_structure.txt'
+def main(argv=None):
+    from distance_cache import distance_cache, DEFAULT_CACHE_DIR  # SciPy, only needed by the CLI
+
+    parser = argparse.ArgumentParser(description="Assign the nearest ambulance station to every hospital")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--engine', default=None, choices=ENGINES,
+                        help="point-to-point routing engine (default: one multi-source Dijkstra from all stations)")
+    parser.add_argument('--hierarchy', default=None, help="saved contraction hierarchy for --engine ch")
+    parser.add_argument('--cache-dir', default=None, nargs='?', const=DEFAULT_CACHE_DIR,
+                        help=f"read the hospital trees from a persistent distance cache (default dir {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--partition', default=None,
+                        help="also save nearest station, travel time and next hop of every node as .npz")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    cache = distance_cache(G, args.cache_dir) if args.cache_dir and not args.engine else None
+    partition = None
+    if args.partition or (args.engine is None and cache is None):
+        partition = VoronoiPartition(G, [node for node in G.nodes if node.startswith('A')])
+
+    # Assign stations to hospitals based on shortest distance
+    station_assignments, travel_times, travel_paths = assign_stations_to_hospitals(G, engine=args.engine, hierarchy=args.hierarchy, cache=cache, partition=partition)
 
-G = recreate_graph_from_file(file_path)
+    # Save the assignments and travel times to a file
+    output_file_path = 'hospital_to_station_mapping.txt'
+    save_assignments_to_file(station_assignments, travel_times, travel_paths, output_file_path)
+    # Same mapping as arrays; the simulations load it instead of parsing the text
+    save_station_mapping(output_file_path.rsplit('.', 1)[0] + '.npz', station_assignments, travel_times, travel_paths)
+    if args.partition:
+        partition.save(args.partition)
+        print("Nearest station of every node saved to", args.partition)
 
-# Assign stations to hospitals based on shortest distance
-station_assignments, travel_times, travel_paths = assign_stations_to_hospitals(G)
+    print("Ambulance station assignments with travel times have been saved to", output_file_path)
 
-# Save the assignments and travel times to a file
-output_file_path = 'hospital_to_station_mapping.txt'
-save_assignments_to_file(station_assignments, travel_times, travel_paths, output_file_path)
 
-print("Ambulance station assignments with travel times have been saved to", output_file_path)
+if __name__ == "__main__":
+    main()
@@ -1,56 +1,154 @@
-import pulp
+import argparse
+
 import numpy as np
-import matplotlib.pyplot as plt
 
-np.random.seed(42)  # For reproducibility
-n_demand_points = 200  # Number of demand points
-n_potential_locations = 20  # Number of potential ambulance station locations
-service_radius = 3  # Service radius for each ambulance station
-max_stations = 10  # Maximum number of ambulance stations to establish
 
-demand_points = np.random.rand(n_demand_points, 2) * 10
-potential_locations = np.random.rand(n_potential_locations, 2) * 10
+def coverage_matrix(demand_points, potential_locations, service_radius):
+    # Calculate distances between demand points and potential locations
+    distances = np.linalg.norm(demand_points[:, None, :] - potential_locations[None, :, :], axis=2)
+
+    # Binary indicator whether a demand point is within service radius of a potential location
+    return (distances <= service_radius).astype(int)
+
+
+# Candidate sites searched per csgraph call in network_coverage; bounds the
+# dense (sites, nodes) distance block of one call
+NETWORK_CHUNK = 256
+
+
+def network_coverage(graph, demand_nodes, candidate_nodes, service_radius, chunk=NETWORK_CHUNK):
+    # Sparse (demand, candidate) coverage over the road graph (e.g. from
+    # create_graph.recreate_graph_from_file): demand i is covered by candidate j
+    # when an ambulance at j reaches it within service_radius travel time. One
+    # Dijkstra per candidate, stopped at the radius (csgraph's limit), so only the
+    # nodes inside the radius are settled and no all-pairs table is built.
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import dijkstra
+    from csr_graph import csr_graph
+
+    csr = csr_graph(graph)
+    demand = csr.to_index(demand_nodes)
+    candidates = csr.to_index(candidate_nodes)
+    rows, cols = [], []
+    for start in range(0, len(candidates), chunk):
+        # Searches run from the site towards the patient, which matters on directed graphs
+        distances = dijkstra(csr.matrix, directed=True, indices=candidates[start:start + chunk], limit=service_radius)
+        covered_site, covered_demand = np.nonzero(distances[:, demand] <= service_radius)
+        rows.append(covered_demand)
+        cols.append(covered_site + start)
+    rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.int64)
+    return coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                      shape=(len(demand), len(candidates))).tocsr()
+
+
+def solve_mclp(coverage, max_stations, msg=True):
+    # Returns (selected locations, covered demand points) as index lists. msg=False silences the solver log.
+    # coverage is a dense array (coverage_matrix) or a scipy.sparse matrix (network_coverage);
+    # each constraint only lists the locations that cover its demand point.
+    import pulp  # Imported on first solve, like matplotlib in plot_mclp
+    from scipy.sparse import csr_matrix
+
+    coverage = csr_matrix(coverage)
+    coverage.eliminate_zeros()
+    n_demand_points, n_potential_locations = coverage.shape
+    model = pulp.LpProblem("Maximal_Covering_Location_Problem", pulp.LpMaximize)
+    x = pulp.LpVariable.dicts("x", range(n_potential_locations), cat='Binary')
+    y = pulp.LpVariable.dicts("y", range(n_demand_points), cat='Binary')
+
+    model += pulp.lpSum(y[i] for i in range(n_demand_points))
+    for i in range(n_demand_points):
+        covering = coverage.indices[coverage.indptr[i]:coverage.indptr[i + 1]]
+        model += y[i] <= pulp.lpSum(x[j] for j in covering.tolist()), f"Coverage_{i}"
+    model += pulp.lpSum(x[j] for j in range(n_potential_locations)) <= max_stations, "Max_Stations"
+
+
+    model.solve(pulp.PULP_CBC_CMD(msg=msg))
+
+    # Determine covered demand points
+    covered_demand_points = [i for i in range(n_demand_points) if y[i].value() == 1]
+    selected_locations = [j for j in range(n_potential_locations) if x[j].value() == 1]
+    return selected_locations, covered_demand_points
+
+
+def plot_mclp(demand_points, potential_locations, selected_locations, covered_demand_points):
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 10))
+
+    # Plot all demand points
+    plt.scatter(demand_points[:, 0], demand_points[:, 1], c='lightblue', label='Demand Points')
+
+    # Highlight covered demand points
+    if covered_demand_points:
+        plt.scatter(demand_points[covered_demand_points, 0], demand_points[covered_demand_points, 1], c='blue', label='Covered Demand Points')
+
+    # Plot potential locations for ambulance stations
+    plt.scatter(potential_locations[:, 0], potential_locations[:, 1], marker='s', s=100, c='orange', label='Potential Stations')
 
-# Calculate distances between demand points and potential locations
-distances = np.linalg.norm(demand_points[:, None, :] - potential_locations[None, :, :], axis=2)
+    # Highlight selected locations for ambulance stations
+    if selected_locations:
+        plt.scatter(potential_locations[selected_locations, 0], potential_locations[selected_locations, 1], marker='P', s=200, c='red', label='Selected Stations')
 
-# Binary indicator whether a demand point is within service radius of a potential location
-coverage = (distances <= service_radius).astype(int)
-model = pulp.LpProblem("Maximal_Covering_Location_Problem", pulp.LpMaximize)
-x = pulp.LpVariable.dicts("x", range(n_potential_locations), cat='Binary')
-y = pulp.LpVariable.dicts("y", range(n_demand_points), cat='Binary')
+    plt.title('Ambulance Station Placement Optimization')
+    plt.xlabel('X Coordinate')
+    plt.ylabel('Y Coordinate')
+    plt.legend()
+    plt.grid(True)
+    plt.show()
 
-model += pulp.lpSum(y[i] for i in range(n_demand_points))
-for i in range(n_demand_points):
-    model += y[i] <= pulp.lpSum(x[j] * coverage[i, j] for j in range(n_potential_locations)), f"Coverage_{i}"
-model += pulp.lpSum(x[j] for j in range(n_potential_locations)) <= max_stations, "Max_Stations"
 
+def network_mclp(graph, service_radius, max_stations, demand_nodes=None, candidate_nodes=None, msg=True):
+    # MCLP on the road graph: emergency nodes are the demand and, by default,
+    # also the candidate sites. Returns (selected sites, covered demand nodes).
+    if demand_nodes is None:
+        demand_nodes = [node for node in graph if node.startswith('E')]
+    if candidate_nodes is None:
+        candidate_nodes = demand_nodes
+    coverage = network_coverage(graph, demand_nodes, candidate_nodes, service_radius)
+    selected, covered = solve_mclp(coverage, max_stations, msg=msg)
+    return [candidate_nodes[j] for j in selected], [demand_nodes[i] for i in covered]
 
-model.solve()
 
-# Determine covered demand points
-covered_demand_points = [i for i in range(n_demand_points) if y[i].value() == 1]
-selected_locations = [j for j in range(n_potential_locations) if x[j].value() == 1]
-plt.figure(figsize=(12, 10))
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve and plot the MCLP example on 200 random demand points, "
+                                                 "or solve it on a road graph with --graph")
+    parser.add_argument('--graph', help="graph file; coverage by travel time over its roads instead of straight lines")
+    parser.add_argument('--radius', type=float, default=3.0, help="service radius in travel time (--graph)")
+    parser.add_argument('--stations', type=int, default=10, help="maximum number of stations (--graph)")
+    parser.add_argument('--candidates', type=int, help="random sample of this many candidate sites (--graph, default all)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.graph:
+        import random
+        import time
+        from create_graph import recreate_graph_from_file
 
-# Plot all demand points
-plt.scatter(demand_points[:, 0], demand_points[:, 1], c='lightblue', label='Demand Points')
+        G = recreate_graph_from_file(args.graph)
+        demand = [node for node in G if node.startswith('E')]
+        candidates = demand
+        if args.candidates and args.candidates < len(demand):
+            candidates = random.Random(args.seed).sample(demand, args.candidates)
+        start = time.perf_counter()
+        selected, covered = network_mclp(G, args.radius, args.stations, demand, candidates, msg=False)
+        print(f"{len(candidates)} candidate sites, {len(demand)} demand nodes, solved in {time.perf_counter() - start:.2f} s")
+        print(f"Selected stations: {selected}")
+        print(f"Covered {len(covered)} of {len(demand)} demand nodes within {args.radius}")
+        return
 
-# Highlight covered demand points
-if covered_demand_points:
-    plt.scatter(demand_points[covered_demand_points, 0], demand_points[covered_demand_points, 1], c='blue', label='Covered Demand Points')
+    np.random.seed(42)  # For reproducibility
+    n_demand_points = 200  # Number of demand points
+    n_potential_locations = 20  # Number of potential ambulance station locations
+    service_radius = 3  # Service radius for each ambulance station
+    max_stations = 10  # Maximum number of ambulance stations to establish
 
-# Plot potential locations for ambulance stations
-plt.scatter(potential_locations[:, 0], potential_locations[:, 1], marker='s', s=100, c='orange', label='Potential Stations')
+    demand_points = np.random.rand(n_demand_points, 2) * 10
+    potential_locations = np.random.rand(n_potential_locations, 2) * 10
 
-# Highlight selected locations for ambulance stations
-if selected_locations:
-    plt.scatter(potential_locations[selected_locations, 0], potential_locations[selected_locations, 1], marker='P', s=200, c='red', label='Selected Stations')
+    coverage = coverage_matrix(demand_points, potential_locations, service_radius)
+    selected_locations, covered_demand_points = solve_mclp(coverage, max_stations)
+    plot_mclp(demand_points, potential_locations, selected_locations, covered_demand_points)
 
-plt.title('Ambulance Station Placement Optimization')
-plt.xlabel('X Coordinate')
-plt.ylabel('Y Coordinate')
-plt.legend()
-plt.grid(True)
-plt.show()
 
+if __name__ == "__main__":
+    main()
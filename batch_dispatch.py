@@ -0,0 +1,118 @@
+import networkx as nx
+import numpy as np
+
+# Stand-in for unreachable pairs inside the solver; such matches are dropped afterwards
+UNREACHABLE = 1e18
+
+
+def solve_assignment(cost):
+    # Minimum-cost matching of rows to columns, (row indices, column indices).
+    # Uses SciPy when it is installed and the Hungarian method below otherwise.
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    finite = np.where(np.isfinite(cost), cost, UNREACHABLE)
+    try:
+        from scipy.optimize import linear_sum_assignment
+        rows, cols = linear_sum_assignment(finite)
+    except ImportError:
+        if finite.shape[0] <= finite.shape[1]:
+            rows, cols = _hungarian(finite)
+        else:
+            cols, rows = _hungarian(finite.T)
+            order = np.argsort(rows)
+            rows, cols = rows[order], cols[order]
+    keep = np.isfinite(cost[rows, cols])
+    return rows[keep], cols[keep]
+
+
+def _hungarian(cost):
+    # Shortest augmenting path Hungarian method with potentials, for n rows <= m
+    # columns, O(n^2 m). The inner scan over columns is vectorised.
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)  # p[j]: row (1-based) matched to column j, 0 if none
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improve = free & (reduced < minv[1:])
+            minv[1:][improve] = reduced[improve]
+            way[1:][improve] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    cols = np.flatnonzero(p[1:])
+    rows = p[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def distance_row(path_cache, source, targets):
+    # Distances from one ambulance to every pending patient, from the cached tree when there is one
+    if hasattr(path_cache, 'distances'):
+        return path_cache.distances(source, targets)  # csr_graph.CSRPathCache, already an array
+    if hasattr(path_cache, 'search'):
+        distances, _ = path_cache.search(source)
+        return np.array([distances.get(target, np.inf) for target in targets])
+    row = np.full(len(targets), np.inf)
+    for j, target in enumerate(targets):
+        try:
+            row[j] = path_cache.distance(source, target)
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            pass
+    return row
+
+
+def process_queue_in_batch(dispatcher):
+    # Drain the priority queue with one optimal matching instead of greedy
+    # one-by-one dispatches. The fleet is refreshed once for the whole batch.
+    # At most one patient per free ambulance is taken, oldest first, so the
+    # matching never starves a patient that has been waiting longer.
+    dispatcher.update_available_ambulances()
+    free = list(dispatcher.available_ambulances)
+    if not free or not dispatcher.priority_queue:
+        return []
+    pending = [dispatcher.queue_pop() for _ in range(min(len(free), len(dispatcher.priority_queue)))]
+    patient_nodes = [entry[1][0] for entry in pending]
+
+    # Patient-to-hospital leg, the same for every ambulance
+    to_hospital = np.full(len(pending), np.inf)
+    for j, entry in enumerate(pending):
+        try:
+            to_hospital[j] = dispatcher.hospital_table.distance(entry[1][0], entry[2])
+        except (nx.NetworkXNoPath, nx.NodeNotFound):  # No path, or no hospital assigned
+            pass
+    ambulance_nodes = [dispatcher.available_ambulances[ambulance_id][2] for ambulance_id in free]
+    cost = np.vstack([distance_row(dispatcher.path_cache, node, patient_nodes) for node in ambulance_nodes])
+    cost = cost + to_hospital[None, :]
+
+    rows, cols = solve_assignment(cost)
+    matched = set()
+    for i, j in zip(rows, cols):
+        priority, patient_call, hospital_node, patient_type, _, patient_id = pending[j]
+        dispatcher.assign_ambulance(free[i], patient_call, hospital_node, patient_id, float(cost[i, j]))
+        matched.add(j)
+    # Unreachable patients go back on the queue with their original priority
+    for j, entry in enumerate(pending):
+        if j not in matched:
+            dispatcher.queue_push(entry)
+    return [(free[i], pending[j][5]) for i, j in zip(rows, cols)]
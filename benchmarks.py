@@ -0,0 +1,340 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+import networkx as nx
+
+STAGES = ('cold_start', 'load_graph', 'hospital_assignment', 'station_assignment', 'kmeans', 'mclp', 'dispatch')
+
+# hospital_engine is passed to assign_hospitals_to_patients (None: one multi-source
+# Dijkstra from all hospitals, voronoi.py).
+# 'synthetic' graphs are jittered grids written once to the work directory.
+SCALES = {
+    'small': dict(graph='graph_structure.txt', hospital_engine=None, stations=7, fleet=5, calls=2000, rate=1 / 30,
+                  nearest_k=None, mclp_demand=None, mclp_candidates=20),
+    'city': dict(graph='new_Ujjain.txt', hospital_engine=None, stations=10, fleet=20, calls=5000, rate=1 / 10,
+                 nearest_k=5, mclp_demand=2000, mclp_candidates=40),
+    'large': dict(graph='synthetic', side=100, hospitals=20, stations=30, fleet=60, calls=5000, rate=1 / 5,
+                  hospital_engine=None, nearest_k=5, mclp_demand=3000, mclp_candidates=60),
+}
+
+# Entry points imported by the cold_start stage, and the heavy packages none of
+# them may load at import time (each is imported by the step that uses it)
+COLD_START_MODULES = ('cli', 'simulation_rp', 'sim_wrp', 'update_avlbl', 'generate_hospital_assignments',
+                      'Ambulance_station_assignement', 'city', 'animation', 'MCLP', 'optimal_location')
+HEAVY_MODULES = ('matplotlib', 'sklearn', 'pulp', 'scipy', 'requests')
+
+# Shortest-path searches, counted by wrapping the functions that run one
+_SEARCH_FUNCTIONS = [
+    ('networkx.algorithms.shortest_paths.weighted', '_dijkstra_multisource', 'networkx'),
+    ('nearest_ambulances', 'k_nearest_ambulances', 'k_nearest'),
+]
+_SEARCH_METHODS = [
+    ('routing', 'Router', '_astar', 'router'),
+    ('routing', 'Router', '_bidirectional', 'router'),
+    ('contraction_hierarchy', 'ContractionHierarchy', '_search', 'ch'),
+    ('voronoi', 'VoronoiPartition', '_search', 'voronoi'),
+]
+
+
+@contextmanager
+def count_searches(counts):
+    # Adds the number of searches per kind to counts while the block runs.
+    # Functions imported with 'from x import f' are rebound in every module holding them.
+    import importlib
+    patched = []
+
+    def counting(function, kind):
+        def wrapper(*args, **kwargs):
+            counts[kind] = counts.get(kind, 0) + 1
+            return function(*args, **kwargs)
+        return wrapper
+
+    for module_name, name, kind in _SEARCH_FUNCTIONS:
+        original = getattr(importlib.import_module(module_name), name)
+        wrapper = counting(original, kind)
+        for module in list(sys.modules.values()):
+            if getattr(module, name, None) is original:
+                setattr(module, name, wrapper)
+                patched.append((module, name, original))
+    for module_name, class_name, name, kind in _SEARCH_METHODS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        original = cls.__dict__[name]
+        setattr(cls, name, counting(original, kind))
+        patched.append((cls, name, original))
+    try:
+        yield counts
+    finally:
+        for owner, name, original in reversed(patched):
+            setattr(owner, name, original)
+
+
+def write_synthetic_graph(file_path, side, hospitals, seed=0):
+    # Jittered side x side grid in the graph_structure.txt format, with 4-neighbour
+    # roads weighted by length. Stations are added later like on new_Ujjain.txt.
+    rng = np.random.default_rng(seed)
+    n = side * side
+    pos = np.stack(np.meshgrid(np.arange(side), np.arange(side), indexing='ij'), axis=-1).reshape(-1, 2).astype(float)
+    pos += rng.uniform(-0.3, 0.3, pos.shape)
+    types = np.array(['E'] * n)
+    types[rng.choice(n, hospitals, replace=False)] = 'H'
+    names = [f"{t}{i}" for i, t in enumerate(types)]
+    with open(file_path, 'w') as f:
+        f.write(f"{n}\n")
+        for i, (t, (x, y)) in enumerate(zip(types, pos)):
+            f.write(f"{t} {i} {x} {y}\n")
+        for i in range(n):
+            r, c = divmod(i, side)
+            for j in ([i + 1] if c + 1 < side else []) + ([i + side] if r + 1 < side else []):
+                # Every 10th row and column is a fast arterial road, which gives the graph a hierarchy
+                arterial = (r % 10 == 0) if j == i + 1 else (c % 10 == 0)
+                length = np.linalg.norm(pos[i] - pos[j]) * (0.3 if arterial else 1.0) * rng.uniform(0.9, 1.1)
+                f.write(f"{names[i]} {names[j]} {length:.2f}\n")
+
+
+def add_stations(graph, count, seed=0):
+    # Graphs without ambulance stations get `count` emergency nodes relabelled 'A<id>'
+    if any(data['node_type'] == 'A' for _, data in graph.nodes(data=True)):
+        return graph
+    rng = np.random.default_rng(seed)
+    emergency = sorted(node for node, data in graph.nodes(data=True) if data['node_type'] == 'E')
+    chosen = [emergency[i] for i in rng.choice(len(emergency), count, replace=False)]
+    graph = nx.relabel_nodes(graph, {node: 'A' + node[1:] for node in chosen})
+    for node in chosen:
+        graph.nodes['A' + node[1:]]['node_type'] = 'A'
+    return graph
+
+
+def _station_mapping(graph, engine):
+    from Ambulance_station_assignement import assign_stations_to_hospitals
+    assignments, travel_times, travel_paths = assign_stations_to_hospitals(graph, engine=engine)
+    return {hospital: {'station': station, 'travel_time': travel_times[(station, hospital)],
+                       'travel_path': travel_paths[(hospital, station)]}
+            for hospital, station in assignments.items()}
+
+
+# Each stage takes the scale's context and may store what later stages need in it.
+# Per-graph caches (hospital table, contraction hierarchy) are dropped before every
+# run so each stage is measured cold.
+
+def stage_cold_start(ctx):
+    # A fresh interpreter importing every entry point: what each run pays before any work.
+    # Timed as the child's CPU time, the wall time of a process start swings with machine load.
+    code = (f"import sys, time; import {', '.join(COLD_START_MODULES)}; "
+            f"print(time.process_time(), ' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    seconds, *loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                      cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    if loaded:
+        raise RuntimeError(f"importing the entry points loaded {', '.join(loaded)}")
+    return float(seconds)
+
+
+def stage_load_graph(ctx):
+    from create_graph import recreate_graph_from_file
+    graph = recreate_graph_from_file(ctx['graph_file'])
+    ctx['graph'] = add_stations(graph, ctx['config']['stations'])
+
+
+def stage_hospital_assignment(ctx):
+    from generate_hospital_assignments import assign_hospitals_to_patients
+    ctx['hospital_assignments'] = assign_hospitals_to_patients(ctx['graph'], engine=ctx['config']['hospital_engine'])
+
+
+def stage_station_assignment(ctx):
+    ctx['hospital_to_station'] = _station_mapping(ctx['graph'], None)
+
+
+def stage_kmeans(ctx):
+    from optimal_location import find_optimal_locations
+    pos = nx.get_node_attributes(ctx['graph'], 'pos')
+    points = np.array([pos[node] for node in ctx['graph'] if node.startswith('E')])
+    find_optimal_locations(ctx['config']['stations'], points)
+
+
+def stage_mclp(ctx):
+    from MCLP import coverage_matrix, solve_mclp
+    config = ctx['config']
+    rng = np.random.default_rng(0)
+    points = np.array([data['pos'] for node, data in ctx['graph'].nodes(data=True) if node.startswith('E')])
+    if config['mclp_demand'] and len(points) > config['mclp_demand']:
+        points = points[rng.choice(len(points), config['mclp_demand'], replace=False)]
+    candidates = points[rng.choice(len(points), config['mclp_candidates'], replace=False)]
+    # A radius of 15% of the bounding-box diagonal works for grid units and lat/lon alike
+    radius = 0.15 * np.linalg.norm(points.max(axis=0) - points.min(axis=0))
+    solve_mclp(coverage_matrix(points, candidates, radius), config['stations'], msg=False)
+
+
+def stage_dispatch(ctx):
+    from simulation_rp import AmbulanceDispatch
+    from call_schedule import CallSchedule
+    from scenario_generator import generate_calls, fleet_config, ambulance_data
+    from trace_sink import ColumnarSink, RESULTS
+    config, graph = ctx['config'], ctx['graph']
+    assignments = ctx['hospital_assignments']
+    nodes, chunks = generate_calls(graph, config['rate'], n_calls=config['calls'], seed=0,
+                                   weights={node: 1.0 for node in assignments})
+
+    def calls():
+        patient_id = 0
+        for batch in chunks:
+            for t, node, patient_type in zip(batch['time'].tolist(), batch['node'].tolist(), batch['patient_type'].tolist()):
+                patient_id += 1
+                yield patient_id, (nodes[node], patient_type, t)
+
+    sink = ColumnarSink(None, level=RESULTS)
+    dispatcher = AmbulanceDispatch(graph, ambulance_data(fleet_config(graph, config['fleet'])), trace=sink,
+                                   hospital_assignments=assignments, hospital_to_station=ctx['hospital_to_station'],
+                                   nearest_k=config['nearest_k'])
+    dispatcher.run_simulation(CallSchedule(calls(), presorted=True), event_driven=True)
+
+
+STAGE_FUNCTIONS = {name: globals()[f"stage_{name}"] for name in STAGES}
+# Timed runs per stage. Their median is compared, a single run is too noisy to gate on.
+DEFAULT_REPEAT = 5
+
+
+def run_stage(ctx, stage, repeat=DEFAULT_REPEAT, memory=True):
+    # Best and median wall time over `repeat` runs and the median absolute
+    # deviation of the runs, then one traced run for peak memory and search counts
+    function = STAGE_FUNCTIONS[stage]
+    times = []
+    for _ in range(repeat):
+        if 'graph' in ctx:
+            ctx['graph'].graph.clear()
+        gc.collect()
+        start = time.perf_counter()
+        seconds = function(ctx)  # A stage may measure itself, otherwise it is wall time
+        times.append(time.perf_counter() - start if seconds is None else seconds)
+    median = statistics.median(times)
+    counts = {}
+    if 'graph' in ctx:
+        ctx['graph'].graph.clear()
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    try:
+        with count_searches(counts):
+            function(ctx)
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return {
+        'seconds': min(times),
+        'median': median,
+        'mad': statistics.median(abs(t - median) for t in times),
+        'peak_mb': None if peak is None else peak / 2 ** 20,
+        'searches': sum(counts.values()),
+        'searches_by_kind': counts,
+    }
+
+
+def run_scale(scale, stages=STAGES, repeat=DEFAULT_REPEAT, memory=True, workdir=None):
+    config = SCALES[scale]
+    graph_file = config['graph']
+    if graph_file == 'synthetic':
+        workdir = workdir or tempfile.gettempdir()
+        graph_file = os.path.join(workdir, f"synthetic_{config['side']}x{config['side']}_{config['hospitals']}h.txt")
+        if not os.path.exists(graph_file):
+            write_synthetic_graph(graph_file, config['side'], config['hospitals'])
+    ctx = {'config': config, 'graph_file': graph_file}
+    results = {}
+    # Later stages need the outputs of earlier ones, so those run untimed when not selected
+    for stage in STAGES:
+        needed = (stage == 'load_graph'
+                  or (stage == 'hospital_assignment' and 'dispatch' in stages)
+                  or (stage == 'station_assignment' and 'dispatch' in stages))
+        if stage in stages:
+            try:
+                results[stage] = run_stage(ctx, stage, repeat, memory)
+            except ImportError as e:
+                results[stage] = {'skipped': f"missing dependency: {e.name}"}
+                if needed:
+                    raise
+            print(f"{scale:>6} {stage:<20} {_format(results[stage])}", flush=True)
+        elif needed:
+            STAGE_FUNCTIONS[stage](ctx)
+    return results
+
+
+def _format(row):
+    if 'skipped' in row:
+        return row['skipped']
+    memory = '' if row['peak_mb'] is None else f"{row['peak_mb']:9.1f} MB"
+    return f"{row['seconds']:9.3f} s {memory} {row['searches']:9d} searches"
+
+
+# Three median absolute deviations, scaled (1.4826) to a standard deviation for normal noise
+NOISE_MADS = 3 * 1.4826
+
+
+def compare(results, baseline, threshold=0.25, min_seconds=0.05):
+    # Regressions past threshold (relative) against the baseline results. Times
+    # are compared by their median over the runs, so one slow outlier run moves
+    # neither side. Differences within min_seconds or within three (scaled) median
+    # absolute deviations of either run are ignored, they are noise. Files
+    # without medians compare their best time.
+    regressions = []
+    for scale, stages in results.items():
+        for stage, row in stages.items():
+            base = baseline.get(scale, {}).get(stage)
+            if base is None or 'skipped' in row or 'skipped' in base:
+                continue
+            now, before = row.get('median', row['seconds']), base.get('median', base['seconds'])
+            noise = max(min_seconds, NOISE_MADS * row.get('mad', 0), NOISE_MADS * base.get('mad', 0))
+            if now > before * (1 + threshold) and now - before > noise:
+                regressions.append(f"{scale}/{stage}: median {now:.3f} s vs {before:.3f} s")
+            if row['peak_mb'] is not None and base['peak_mb'] is not None and row['peak_mb'] > base['peak_mb'] * (1 + threshold):
+                regressions.append(f"{scale}/{stage}: peak {row['peak_mb']:.1f} MB vs {base['peak_mb']:.1f} MB")
+            if row['searches'] > base['searches'] * (1 + threshold):
+                regressions.append(f"{scale}/{stage}: {row['searches']} searches vs {base['searches']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage and check for regressions")
+    parser.add_argument('--scales', nargs='+', default=['small', 'city'], choices=sorted(SCALES))
+    parser.add_argument('--stages', nargs='+', default=list(STAGES), choices=STAGES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per stage, their median is compared")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc run (peak memory)")
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="earlier --out file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed relative slowdown before failing")
+    parser.add_argument('--workdir', default=None, help="where the synthetic graph is written")
+    args = parser.parse_args(argv)
+
+    results = {scale: run_scale(scale, args.stages, args.repeat, not args.no_memory, args.workdir) for scale in args.scales}
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Results saved to", args.out)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        if regressions:
+            sys.exit(1)
+        print(f"No stage regressed by more than {args.threshold:.0%} against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
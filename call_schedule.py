@@ -0,0 +1,63 @@
+from bisect import bisect_right
+
+
+class CallSchedule:
+    # Time-ordered patient calls with a cursor, so the simulation asks "which
+    # calls are due by time t" in O(k) instead of scanning every call each tick.
+    #
+    # patient_calls is either a dict {patient_id: (node, type, time)} like the
+    # ones in the simulation files, or an iterable of (patient_id, call) pairs.
+    # With presorted=True an iterable is consumed lazily, so a long call history
+    # can be streamed from disk without ever being held in memory.
+    def __init__(self, patient_calls, presorted=False):
+        items = patient_calls.items() if isinstance(patient_calls, dict) else patient_calls
+        if presorted:
+            self.times = None  # Streaming: no arrays, only one call of look-ahead
+            self._stream = iter(items)
+            self._pending = next(self._stream, None)
+        else:
+            entries = sorted(items, key=lambda item: item[1][2])
+            self.times = [call[2] for _, call in entries]
+            self.entries = entries
+            self._cursor = 0
+        self.last_time = None  # Arrival time of the latest call handed out so far
+
+    def peek_time(self):
+        # Arrival time of the next call, or None when the schedule is exhausted
+        if self.times is None:
+            return None if self._pending is None else self._pending[1][2]
+        if self._cursor < len(self.times):
+            return self.times[self._cursor]
+        return None
+
+    def pop_due(self, until):
+        # All calls with arrival time <= until that have not been returned yet
+        if self.times is None:
+            due = []
+            while self._pending is not None and self._pending[1][2] <= until:
+                due.append(self._pending)
+                self._advance_stream()
+        else:
+            end = bisect_right(self.times, until, lo=self._cursor)
+            due = self.entries[self._cursor:end]
+            self._cursor = end
+        if due:
+            self.last_time = due[-1][1][2]
+        return due
+
+    def window(self, start, end):
+        # Calls with start < time <= end, independent of the cursor
+        if self.times is None:
+            raise ValueError("window() needs a materialised schedule, not a stream")
+        return self.entries[bisect_right(self.times, start):bisect_right(self.times, end)]
+
+    def _advance_stream(self):
+        previous_time = self._pending[1][2]
+        self._pending = next(self._stream, None)
+        if self._pending is not None and self._pending[1][2] < previous_time:
+            raise ValueError(f"Streamed calls must be sorted by time, got {self._pending[1][2]} after {previous_time}")
+
+    def __len__(self):
+        if self.times is None:
+            raise TypeError("A streamed schedule has no length")
+        return len(self.times)
@@ -1,7 +1,6 @@
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 import networkx as nx
-import matplotlib.patches as mpatches
 from optimal_location import find_optimal_locations
 
 
@@ -25,81 +24,103 @@ def connect_components(G):
         if closest_nodes:
             G.add_edge(*closest_nodes, weight=min_distance)
 
-np.random.seed(42)
-n_emergency_calls = 200
-n_hospitals = 10
-max_connection_distance = 20  # Maximum distance for direct connection
-connection_probability = 0.1  # Probability of connecting two nodes within max distance
-
-
-
-emergency_calls = np.random.rand(n_emergency_calls, 2) * 100
-hospitals = np.random.rand(n_hospitals, 2) * 100
-
-
-n_ambulance_stations = 7 
-ambulance_stations,labels = find_optimal_locations(n_ambulance_stations, emergency_calls)
-
-# Combine all nodes into a single array for pairwise distance computation
-all_nodes = np.concatenate((emergency_calls, hospitals, ambulance_stations))
-labels = ["E"] * n_emergency_calls + ["H"] * n_hospitals + ["A"] * n_ambulance_stations
-label_positions = {f"{labels[i]}{i}": pos for i, pos in enumerate(all_nodes)}
-
-
-G = nx.Graph()
-
-
-for i, label in enumerate(labels):
-    G.add_node(f"{label}{i}", pos=all_nodes[i], node_type=label)
-
-# Create random edges based on proximity
-for i, point_i in enumerate(all_nodes):
-    for j, point_j in enumerate(all_nodes[i+1:], start=i+1):  # Avoid self-loops and duplicate edges
-        if np.random.rand() < connection_probability:
-            distance = np.linalg.norm(point_i - point_j)
-            if distance <= max_connection_distance:
-                G.add_edge(f"{labels[i]}{i}", f"{labels[j]}{j}", weight=distance)
-
-# Connect all disconnected components
-connect_components(G)
-
-content = f"{G.number_of_nodes()}\n"
-
-
-for node in G.nodes(data=True):
-    node_type = node[0][0]  # First character of node ID represents the type
-    node_id = node[0][1:]   # The rest of the node ID
-    pos = node[1]['pos']
-    content += f"{node_type} {node_id} {pos[0]} {pos[1]}\n"
-
-# Write edge information: Node1, Node2, Weight
-for edge in G.edges(data=True):
-    node1, node2, weight = edge
-    content += f"{node1} {node2} {weight['weight']:.2f}\n"
-
-# Display the content to be written to the file
-print(content)
-with open('graph_structure.txt', 'w') as f:
-    f.write(content)
-
-# Visualization
-plt.figure(figsize=(12, 12))
-pos = nx.get_node_attributes(G, 'pos')
-nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'E'], node_color='blue', node_size=50, label='Emergency Calls')
-nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'H'], node_color='green', node_size=100, label='Hospitals')
-nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'A'], node_color='red', node_size=100, label='Ambulance Stations')
-nx.draw_networkx_edges(G, pos, width=1, alpha=0.5)
-nx.draw_networkx_labels(G, pos, font_size=8, verticalalignment='bottom')
-
-# Create legend
-plt.legend(handles=[
-    mpatches.Patch(color='blue', label='Emergency Calls'),
-    mpatches.Patch(color='green', label='Hospitals'),
-    mpatches.Patch(color='red', label='Ambulance Stations')
-])
-
-plt.title('City Map-like Graph Structure')
-plt.grid(True)
-plt.axis('equal') 
-plt.show()
-
+def generate_city(n_emergency_calls=200, n_hospitals=10, n_ambulance_stations=7, max_connection_distance=20,
+                  connection_probability=0.1, seed=42):
+    # max_connection_distance: maximum distance for a direct connection,
+    # connection_probability: probability of connecting two nodes within it
+    np.random.seed(seed)
+
+    emergency_calls = np.random.rand(n_emergency_calls, 2) * 100
+    hospitals = np.random.rand(n_hospitals, 2) * 100
+
+    ambulance_stations,labels = find_optimal_locations(n_ambulance_stations, emergency_calls)
+
+    # Combine all nodes into a single array for pairwise distance computation
+    all_nodes = np.concatenate((emergency_calls, hospitals, ambulance_stations))
+    labels = ["E"] * n_emergency_calls + ["H"] * n_hospitals + ["A"] * n_ambulance_stations
+
+    G = nx.Graph()
+
+    for i, label in enumerate(labels):
+        G.add_node(f"{label}{i}", pos=all_nodes[i], node_type=label)
+
+    # Create random edges based on proximity
+    for i, point_i in enumerate(all_nodes):
+        for j, point_j in enumerate(all_nodes[i+1:], start=i+1):  # Avoid self-loops and duplicate edges
+            if np.random.rand() < connection_probability:
+                distance = np.linalg.norm(point_i - point_j)
+                if distance <= max_connection_distance:
+                    G.add_edge(f"{labels[i]}{i}", f"{labels[j]}{j}", weight=distance)
+
+    # Connect all disconnected components
+    connect_components(G)
+    return G
+
+
+def graph_to_text(G):
+    # The graph_structure.txt format read by create_graph.recreate_graph_from_file
+    content = f"{G.number_of_nodes()}\n"
+
+    for node in G.nodes(data=True):
+        node_type = node[0][0]  # First character of node ID represents the type
+        node_id = node[0][1:]   # The rest of the node ID
+        pos = node[1]['pos']
+        content += f"{node_type} {node_id} {pos[0]} {pos[1]}\n"
+
+    # Write edge information: Node1, Node2, Weight
+    for edge in G.edges(data=True):
+        node1, node2, weight = edge
+        content += f"{node1} {node2} {weight['weight']:.2f}\n"
+    return content
+
+
+def plot_city(G):
+    import matplotlib.pyplot as plt  # Only needed when drawing
+    import matplotlib.patches as mpatches
+
+    plt.figure(figsize=(12, 12))
+    pos = nx.get_node_attributes(G, 'pos')
+    nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'E'], node_color='blue', node_size=50, label='Emergency Calls')
+    nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'H'], node_color='green', node_size=100, label='Hospitals')
+    nx.draw_networkx_nodes(G, pos, nodelist=[n for n in G.nodes if G.nodes[n]['node_type'] == 'A'], node_color='red', node_size=100, label='Ambulance Stations')
+    nx.draw_networkx_edges(G, pos, width=1, alpha=0.5)
+    nx.draw_networkx_labels(G, pos, font_size=8, verticalalignment='bottom')
+
+    # Create legend
+    plt.legend(handles=[
+        mpatches.Patch(color='blue', label='Emergency Calls'),
+        mpatches.Patch(color='green', label='Hospitals'),
+        mpatches.Patch(color='red', label='Ambulance Stations')
+    ])
+
+    plt.title('City Map-like Graph Structure')
+    plt.grid(True)
+    plt.axis('equal') 
+    plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a random connected city graph")
+    parser.add_argument('--out', default='graph_structure.txt')
+    parser.add_argument('--emergencies', type=int, default=200)
+    parser.add_argument('--hospitals', type=int, default=10)
+    parser.add_argument('--stations', type=int, default=7, help="ambulance stations, placed by K-means")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-plot', action='store_true')
+    args = parser.parse_args(argv)
+
+    G = generate_city(args.emergencies, args.hospitals, args.stations, seed=args.seed)
+    content = graph_to_text(G)
+
+    # Display the content to be written to the file
+    print(content)
+    with open(args.out, 'w') as f:
+        f.write(content)
+
+    # Visualization
+    if not args.no_plot:
+        plot_city(G)
+
+
+if __name__ == "__main__":
+    main()
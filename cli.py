@@ -0,0 +1,80 @@
+import argparse
+import importlib
+import sys
+import time
+
+# command -> target -> (module, help). Every module has main(argv); it is imported
+# only when its target runs, so `python cli.py --help` loads nothing but argparse.
+COMMANDS = {
+    'generate': {
+        'city': ('city', "random connected city graph (graph_structure.txt)"),
+        'map': ('real_data', "road network with hospitals from the Overpass API (ujjain_map_data.txt)"),
+        'renumber': ('create_graph2', "renumber ujjain_map_data.txt into new_Ujjain.txt"),
+        'scenario': ('scenario_generator', "synthetic call workload and fleet for load testing"),
+    },
+    'preprocess': {
+        'binary': ('graph_binary', "convert a text graph to the memory-mappable binary format"),
+        'distances': ('distance_cache', "fill the persistent hospital and station distance cache"),
+        'hospitals': ('generate_hospital_assignments', "nearest hospital of every emergency node"),
+        'stations': ('Ambulance_station_assignement', "nearest ambulance station of every hospital"),
+        'hierarchy': ('contraction_hierarchy', "build and save a contraction hierarchy"),
+        'periods': ('travel_profiles', "per-period distance tables for time-of-day travel times"),
+    },
+    'optimize': {
+        'mclp': ('MCLP', "maximal covering location model for station placement"),
+        'kmeans': ('optimal_location', "K-means station placement"),
+        'reassign': ('incremental_assignment', "update the assignments after hospitals or stations change"),
+    },
+    'simulate': {
+        'rp': ('simulation_rp', "example run with the returning protocol"),
+        'wrp': ('sim_wrp', "example run without the returning protocol"),
+        'path': ('update_avlbl', "example run that records delivery paths"),
+        'replications': ('replications', "seeded Monte Carlo replications of the dispatch policies"),
+        'benchmark': ('benchmarks', "time every pipeline stage and check for regressions"),
+        'engines': ('routing', "compare the routing engines"),
+        'roads': ('road_updates', "run with roads closing or changing travel time during the simulation"),
+    },
+    'animate': ('animation', "animate two ambulances serving the assigned emergencies"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Ambulance dispatch: generate, preprocess, optimize, simulate, animate")
+    parser.add_argument('--timing', action='store_true', help="print import and run time of the command to stderr")
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command, targets in COMMANDS.items():
+        # add_help=False where the module takes over, so --help shows the module's own options
+        if isinstance(targets, tuple):
+            commands.add_parser(command, help=targets[1], add_help=False)
+            continue
+        sub = commands.add_parser(command, help=f"{command} step")
+        choices = sub.add_subparsers(dest='target', required=True)
+        for target, (_, help_text) in targets.items():
+            choices.add_parser(target, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    args, _ = build_parser().parse_known_args(argv)
+    # Everything after the command (and target) is passed on to the module untouched
+    rest = argv[argv.index(args.command) + 1:]
+    entry = COMMANDS[args.command]
+    if isinstance(entry, tuple):
+        module_name = entry[0]
+    else:
+        module_name = entry[args.target][0]
+        rest = rest[rest.index(args.target) + 1:]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    imported = time.perf_counter()
+    try:
+        return module.main(rest)
+    finally:
+        if args.timing:
+            print(f"{module_name}: import {imported - start:.3f} s, run {time.perf_counter() - imported:.3f} s",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import argparse
+import heapq
+import itertools
+import time
+
+import numpy as np
+import networkx as nx
+
+NO_MIDDLE = -1  # Upward edge that is an original road, not a shortcut
+
+
+def build_hierarchy(graph, weight='weight', settle_limit=200):
+    # Contract the nodes of an undirected road graph one by one, cheapest first,
+    # adding a shortcut u-w through v whenever no witness path at most as long
+    # avoids v. Queries then only ever move "up" the hierarchy, which keeps the
+    # searches tiny. settle_limit bounds every witness search; a search that
+    # gives up early only adds a shortcut that was not strictly needed.
+    if graph.is_directed():
+        raise ValueError("Contraction hierarchies are only built for undirected road graphs")
+    node_ids = list(graph.nodes)
+    index = {node: i for i, node in enumerate(node_ids)}
+    n = len(node_ids)
+    adj = [dict() for _ in range(n)]
+    for u, v, data in graph.edges(data=True):
+        if u == v:
+            continue
+        i, j, w = index[u], index[v], data[weight]
+        if w < adj[i].get(j, float('inf')):
+            adj[i][j] = adj[j][i] = w
+    middle = {}  # (low, high) node index pair -> contracted node the shortcut passes through
+    deleted_neighbors = [0] * n
+
+    def priority(v):
+        return len(_shortcuts(adj, v, settle_limit)) - len(adj[v]) + deleted_neighbors[v]
+
+    heap = [(priority(v), v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.full(n, -1, dtype=np.int32)
+    up = [None] * n
+    next_rank = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        if rank[v] >= 0:
+            continue
+        # Lazy update: contraction of the neighbours may have changed v's priority
+        current = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        for u, w, length in _shortcuts(adj, v, settle_limit):
+            if length < adj[u].get(w, float('inf')):
+                adj[u][w] = adj[w][u] = length
+                middle[(min(u, w), max(u, w))] = v
+        # Every remaining neighbour is contracted later, so these are v's upward edges
+        up[v] = [(u, length, middle.get((min(u, v), max(u, v)), NO_MIDDLE)) for u, length in adj[v].items()]
+        for u in adj[v]:
+            del adj[u][v]
+            deleted_neighbors[u] += 1
+        adj[v] = {}
+        rank[v] = next_rank
+        next_rank += 1
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(edges) for edges in up])
+    flat = [edge for edges in up for edge in edges]
+    return ContractionHierarchy(
+        node_ids,
+        rank,
+        indptr,
+        np.array([edge[0] for edge in flat], dtype=np.int32),
+        np.array([edge[1] for edge in flat], dtype=np.float64),
+        np.array([edge[2] for edge in flat], dtype=np.int32),
+    )
+
+
+def _shortcuts(adj, v, settle_limit):
+    # Shortcuts needed if v were contracted now
+    neighbors = list(adj[v].items())
+    needed = []
+    for i, (u, to_u) in enumerate(neighbors):
+        targets = {w: to_u + to_w for w, to_w in neighbors[i + 1:]}
+        if not targets:
+            continue
+        witness = _witness_search(adj, u, v, max(targets.values()), settle_limit, targets)
+        for w, via_v in targets.items():
+            if witness.get(w, float('inf')) > via_v:
+                needed.append((u, w, via_v))
+    return needed
+
+
+def _witness_search(adj, source, excluded, max_distance, settle_limit, targets):
+    distances = {source: 0}
+    heap = [(0, source)]
+    settled = 0
+    remaining = set(targets)
+    while heap and remaining and settled < settle_limit:
+        distance, node = heapq.heappop(heap)
+        if distance > distances.get(node, float('inf')):
+            continue
+        if distance > max_distance:
+            break
+        settled += 1
+        remaining.discard(node)
+        for neighbor, length in adj[node].items():
+            if neighbor == excluded:
+                continue
+            new_distance = distance + length
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                heapq.heappush(heap, (new_distance, neighbor))
+    return distances
+
+
+class ContractionHierarchy:
+    # Upward graph in CSR form: for node v, up_indices[up_indptr[v]:up_indptr[v+1]]
+    # are its higher-ranked neighbours, with the edge weight and, for shortcuts,
+    # the contracted node in between (NO_MIDDLE for original roads).
+    def __init__(self, node_ids, rank, up_indptr, up_indices, up_weights, up_middle):
+        self.node_ids = list(node_ids)
+        self.index = {node: i for i, node in enumerate(self.node_ids)}
+        self.rank = rank
+        self.up_indptr = up_indptr
+        self.up_indices = up_indices
+        self.up_weights = up_weights
+        self.up_middle = up_middle
+        self.settled = 0
+        # Python lists are much faster than NumPy scalars inside the search loop
+        self._up = [
+            list(zip(up_indices[up_indptr[v]:up_indptr[v + 1]].tolist(), up_weights[up_indptr[v]:up_indptr[v + 1]].tolist()))
+            for v in range(len(self.node_ids))
+        ]
+        self._middle = {}
+        for v in range(len(self.node_ids)):
+            for k in range(up_indptr[v], up_indptr[v + 1]):
+                u, m = int(up_indices[k]), int(up_middle[k])
+                self._middle[(v, u)] = self._middle[(u, v)] = m
+
+    def save(self, file_path):
+        np.savez(file_path, node_ids=np.array([str(node) for node in self.node_ids]), rank=self.rank,
+                 up_indptr=self.up_indptr, up_indices=self.up_indices, up_weights=self.up_weights, up_middle=self.up_middle)
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            return cls(data['node_ids'].tolist(), data['rank'], data['up_indptr'], data['up_indices'], data['up_weights'], data['up_middle'])
+
+    def _search(self, source, target):
+        # Bidirectional search that only follows upward edges
+        s, t = self.index[source], self.index[target]
+        distances = ({s: 0}, {t: 0})
+        predecessors = ({}, {})
+        counter = itertools.count()
+        heaps = ([(0, next(counter), s)], [(0, next(counter), t)])
+        best, meeting = float('inf'), None
+        settled = 0
+        while heaps[0] or heaps[1]:
+            # A direction is done once its smallest key cannot improve the best meeting point
+            for side in (0, 1):
+                if heaps[side] and heaps[side][0][0] >= best:
+                    heaps[side].clear()
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            if not heaps[side]:
+                break
+            distance, _, v = heapq.heappop(heaps[side])
+            if distance > distances[side][v]:
+                continue
+            settled += 1
+            other = distances[1 - side].get(v)
+            if other is not None and distance + other < best:
+                best, meeting = distance + other, v
+            for u, length in self._up[v]:
+                new_distance = distance + length
+                if new_distance < distances[side].get(u, float('inf')):
+                    distances[side][u] = new_distance
+                    predecessors[side][u] = v
+                    heapq.heappush(heaps[side], (new_distance, next(counter), u))
+        self.settled += settled
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+        return s, t, best, meeting, predecessors
+
+    def shortest_path(self, source, target):
+        # (length, path), with shortcuts unpacked into the original roads
+        if source == target:
+            return 0, [source]
+        s, t, best, meeting, predecessors = self._search(source, target)
+        up_path = [meeting]
+        while up_path[-1] != s:
+            up_path.append(predecessors[0][up_path[-1]])
+        up_path.reverse()
+        down_path = [meeting]
+        while down_path[-1] != t:
+            down_path.append(predecessors[1][down_path[-1]])
+        hierarchy_path = up_path + down_path[1:]
+
+        path = [hierarchy_path[0]]
+        for a, b in zip(hierarchy_path, hierarchy_path[1:]):
+            path.extend(self._unpack(a, b)[1:])
+        return best, [self.node_ids[v] for v in path]
+
+    def distance(self, source, target):
+        if source == target:
+            return 0
+        return self._search(source, target)[2]
+
+    def path(self, source, target):
+        return self.shortest_path(source, target)[1]
+
+    def _unpack(self, a, b):
+        # Replace shortcuts by the roads they stand for
+        m = self._middle[(a, b)]
+        if m == NO_MIDDLE:
+            return [a, b]
+        return self._unpack(a, m) + self._unpack(m, b)[1:]
+
+
+def main(argv=None):
+    import random
+    from create_graph import recreate_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Build a contraction hierarchy for a road graph and save it")
+    parser.add_argument('--graph', default='new_Ujjain.txt')
+    parser.add_argument('--out', default=None, help="output .npz file (default: <graph>.ch.npz)")
+    parser.add_argument('--queries', type=int, default=1000, help="random queries to time after building")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    start = time.perf_counter()
+    hierarchy = build_hierarchy(G)
+    print(f"Built hierarchy for {G.number_of_nodes()} nodes in {time.perf_counter() - start:.2f} s, "
+          f"{len(hierarchy.up_indices) - G.number_of_edges()} shortcuts")
+    out = args.out or args.graph.rsplit('.', 1)[0] + '.ch.npz'
+    hierarchy.save(out)
+    print("Saved to", out)
+
+    rng = random.Random(0)
+    nodes = list(G.nodes)
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(args.queries)]
+    start = time.perf_counter()
+    for source, target in pairs:
+        try:
+            hierarchy.distance(source, target)
+        except nx.NetworkXNoPath:
+            pass
+    elapsed = time.perf_counter() - start
+    print(f"Distance: {elapsed / len(pairs) * 1e6:.0f} us per query, {hierarchy.settled / len(pairs):.1f} settled nodes per query")
+    start = time.perf_counter()
+    for source, target in pairs:
+        try:
+            hierarchy.path(source, target)
+        except nx.NetworkXNoPath:
+            pass
+    print(f"Path: {(time.perf_counter() - start) / len(pairs) * 1e6:.0f} us per query")
+
+
+if __name__ == "__main__":
+    main()
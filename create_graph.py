@@ -1,8 +1,10 @@
 import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 
 def recreate_graph_from_file(file_path):
+    if file_path.endswith('.bin'):
+        # Memory-mappable binary graph written by graph_binary.py
+        from graph_binary import load_graph
+        return load_graph(file_path)
     with open(file_path, 'r') as f:
         lines = f.readlines()
     
@@ -15,9 +17,16 @@ def recreate_graph_from_file(file_path):
    
     for i in range(1, n_nodes+1):
         line = lines[i].split()
-        node_type = line[0]
-        node_id = f"{node_type}{line[1]}"
-        x, y = float(line[2]), float(line[3])
+        if len(line) == 3:
+            # 'E12 x y', as written by create_graph2.save_graph_to_file (new_Ujjain.txt)
+            node_type = line[0][0]
+            node_id = line[0]
+            x, y = float(line[1]), float(line[2])
+        else:
+            # 'E 12 x y', as written by city.py (graph_structure.txt)
+            node_type = line[0]
+            node_id = f"{node_type}{line[1]}"
+            x, y = float(line[2]), float(line[3])
         G.add_node(node_id, pos=(x, y), node_type=node_type)
     
     # Extract edges information
@@ -29,7 +38,10 @@ def recreate_graph_from_file(file_path):
 
 
 def visualize_graph(G):
-    
+    # matplotlib is only imported when something is drawn
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
+
     colors = {'E': 'blue', 'H': 'green', 'A': 'red'}
     sizes = {'E': 100, 'H': 200, 'A': 300}
     node_colors = [colors[data['node_type']] for _, data in G.nodes(data=True)]
@@ -50,11 +62,10 @@ def visualize_graph(G):
     plt.axis('equal')  
     plt.show()
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-import networkx as nx
 
 def visualize_graph_with_path(G, path_edges):
+    import matplotlib.pyplot as plt
+
     pos = nx.get_node_attributes(G, 'pos')
     # Define a color mapping
     color_map = {'E': 'blue', 'H': 'green', 'A': 'red'}
@@ -82,10 +93,10 @@ def visualize_graph_with_path(G, path_edges):
 # Assuming `G` is your graph and `shortest_path_edges` is the list of edges obtained from the linear programming solution
 # visualize_graph_with_path(G, shortest_path_edges)
 
-# File path to the 'graph_structure.txt' file
-file_path = 'graph_structure.txt'
-
+if __name__ == "__main__":
+    # File path to the 'graph_structure.txt' file
+    file_path = 'graph_structure.txt'
 
-G_recreated = recreate_graph_from_file(file_path)
+    G_recreated = recreate_graph_from_file(file_path)
 
-#visualize_graph(G_recreated)
+    visualize_graph(G_recreated)
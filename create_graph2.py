@@ -1,6 +1,5 @@
+import argparse
 import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 
 def recreate_graph_from_file(file_path):
     with open(file_path, 'r') as f:
@@ -55,6 +54,8 @@ def save_graph_to_file(G, filename, node_id_map):
 
 
 def visualize_graph(G):
+    import matplotlib.pyplot as plt  # Only needed when drawing
+
     pos = nx.get_node_attributes(G, 'pos')
     colors = ['green' if data['node_type'] == 'Hospital' else 'red' for _, data in G.nodes(data=True)]
     sizes = [30 if data['node_type'] == 'Hospital' else 20 for _, data in G.nodes(data=True)]
@@ -66,9 +67,21 @@ def visualize_graph(G):
 
 
 
-file_path = 'ujjain_map_data.txt'
-G, node_id_map = recreate_graph_from_file(file_path)
-visualize_graph(G)  # Assuming visualize_graph does not need node_id_map
-save_file_path = 'new_Ujjain.txt'
-save_graph_to_file(G, save_file_path, node_id_map)
-print(f"Graph saved in custom format to {save_file_path}")
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Renumber the raw Overpass export into the counted graph format")
+    parser.add_argument('--input', default='ujjain_map_data.txt')
+    parser.add_argument('--out', default='new_Ujjain.txt')
+    parser.add_argument('--no-plot', action='store_true')
+    args = parser.parse_args(argv)
+
+    file_path = args.input
+    G, node_id_map = recreate_graph_from_file(file_path)
+    if not args.no_plot:
+        visualize_graph(G)  # Assuming visualize_graph does not need node_id_map
+    save_file_path = args.out
+    save_graph_to_file(G, save_file_path, node_id_map)
+    print(f"Graph saved in custom format to {save_file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+NO_PREDECESSOR = -9999  # What scipy.sparse.csgraph puts in the predecessor array for unreached nodes
+
+
+class CSRGraph:
+    # The road graph as flat arrays: node i has string id node_ids[i], type
+    # node_types[i] and position coords[i], and its neighbours are
+    # indices[indptr[i]:indptr[i + 1]] with the matching weights. Undirected
+    # graphs store both directions. Shortest paths run in scipy.sparse.csgraph
+    # (compiled code) and come back as NumPy arrays indexed by node.
+    def __init__(self, node_ids, node_types, coords, indptr, indices, weights, directed=False):
+        # Any sequence works for node_ids, e.g. the lazily decoded table of graph_binary.py
+        self.node_ids = node_ids if isinstance(node_ids, Sequence) else list(node_ids)
+        self._index = None
+        self.node_types = np.asarray(node_types)
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.directed = directed
+        n = len(self.indptr) - 1
+        # Built straight from the arrays so zero-weight roads stay explicit edges
+        self.matrix = csr_matrix((self.weights, self.indices, self.indptr), shape=(n, n))
+
+    @classmethod
+    def from_networkx(cls, graph, weight='weight'):
+        node_ids = list(graph.nodes)
+        index = {node: i for i, node in enumerate(node_ids)}
+        node_types = np.array([data.get('node_type', str(node)[0]) for node, data in graph.nodes(data=True)])
+        coords = np.array([data.get('pos', (np.nan, np.nan)) for _, data in graph.nodes(data=True)], dtype=np.float64)
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        indices, weights = [], []
+        for i, node in enumerate(node_ids):
+            for neighbor, data in graph[node].items():
+                indices.append(index[neighbor])
+                weights.append(data[weight])
+            indptr[i + 1] = len(indices)
+        return cls(node_ids, node_types, coords, indptr, indices, weights, directed=graph.is_directed())
+
+    @property
+    def index(self):
+        # String id -> index, built on first use
+        if self._index is None:
+            self._index = {node: i for i, node in enumerate(self.node_ids)}
+        return self._index
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def to_index(self, nodes):
+        return np.array([self.index[node] for node in nodes], dtype=np.int32)
+
+    def nodes_of_type(self, node_type):
+        return np.flatnonzero(self.node_types == node_type).astype(np.int32)
+
+    def shortest_paths(self, sources, limit=np.inf, workers=1, reverse=False):
+        # (distances, predecessors), one row per source index, in one batched call.
+        # With workers > 1 the sources are split over threads, which only helps
+        # when the installed SciPy releases the GIL inside csgraph.dijkstra.
+        # reverse=True gives distances *to* each source; the predecessor of a node
+        # is then its next hop towards the source.
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int32))
+        if workers > 1 and len(sources) > workers:
+            with ThreadPoolExecutor(workers) as pool:
+                parts = list(pool.map(lambda chunk: self.shortest_paths(chunk, limit, reverse=reverse),
+                                      np.array_split(sources, workers)))
+            return np.vstack([p[0] for p in parts]), np.vstack([p[1] for p in parts])
+        matrix = self.matrix.T.tocsr() if reverse and self.directed else self.matrix
+        return dijkstra(matrix, directed=True, indices=sources, return_predecessors=True, limit=limit)
+
+    def nearest_source(self, sources, limit=np.inf):
+        # Multi-source search: for every node its distance to the closest source,
+        # the predecessor towards it and which source that is (-9999 if unreachable)
+        sources = np.atleast_1d(np.asarray(sources, dtype=np.int32))
+        matrix = self.matrix if not self.directed else self.matrix.T.tocsr()
+        return dijkstra(matrix, directed=True, indices=sources, return_predecessors=True, limit=limit, min_only=True)
+
+    def unwind(self, predecessors, source, target):
+        # Index path source -> target from a predecessor row of the search from source
+        path = [target]
+        while path[-1] != source:
+            previous = predecessors[path[-1]]
+            if previous == NO_PREDECESSOR:
+                raise nx.NetworkXNoPath(f"No path from {self.node_ids[source]} to {self.node_ids[target]}")
+            path.append(previous)
+        path.reverse()
+        return path
+
+
+def csr_graph(graph):
+    # One CSRGraph per networkx graph, kept with it like the hospital distance table
+    csr = graph.graph.get('csr_graph')
+    if csr is None:
+        csr = CSRGraph.from_networkx(graph)
+        graph.graph['csr_graph'] = csr
+    return csr
+
+
+class NodeArray(Mapping):
+    # Read-only {node id: value} view of one row of a csgraph result, so code
+    # written against the dicts of ShortestPathCache.search works unchanged.
+    # Unreached nodes (inf distance, -9999 predecessor) are absent.
+    def __init__(self, csr, values, missing):
+        self.csr = csr
+        self.values = values
+        self.missing = missing
+
+    def __getitem__(self, node):
+        value = self.values[self.csr.index[node]]
+        if value == self.missing:
+            raise KeyError(node)
+        if self.missing == NO_PREDECESSOR:
+            return self.csr.node_ids[value]
+        return float(value)
+
+    def __iter__(self):
+        return (self.csr.node_ids[i] for i in np.flatnonzero(self.values != self.missing))
+
+    def __len__(self):
+        return int(np.count_nonzero(self.values != self.missing))
+
+
+class CSRPathCache:
+    # Drop-in for ShortestPathCache (search/distance/path/stats, hits and misses)
+    # that keeps csgraph distance and predecessor rows instead of Python dicts.
+    def __init__(self, csr, maxsize=128):
+        self.csr = csr
+        self.maxsize = maxsize
+        self._rows = OrderedDict()  # Source index -> (distances row, predecessors row)
+        self._pinned = {}  # Rows that are never evicted, e.g. memory-mapped ones from distance_cache.py
+        self.hits = 0
+        self.misses = 0
+
+    def _row(self, source):
+        i = self.csr.index[source]
+        row = self._pinned.get(i)
+        if row is not None:
+            self.hits += 1
+            return row
+        row = self._rows.get(i)
+        if row is not None:
+            self.hits += 1
+            self._rows.move_to_end(i)
+            return row
+        self.misses += 1
+        distances, predecessors = self.csr.shortest_paths(i)
+        row = (distances[0], predecessors[0])
+        self._store(i, row)
+        return row
+
+    def _store(self, i, row):
+        self._rows[i] = row
+        if len(self._rows) > self.maxsize:
+            self._rows.popitem(last=False)
+
+    def pin(self, sources, distances, predecessors):
+        # Serve these sources from the given rows (row k belongs to sources[k]) for good
+        for k, i in enumerate(self.csr.to_index(sources).tolist()):
+            self._pinned[i] = (distances[k], predecessors[k])
+            self._rows.pop(i, None)
+
+    def prefetch(self, sources, workers=1):
+        # Compute the trees of many sources in one batched csgraph call
+        missing = [self.csr.index[s] for s in sources
+                   if self.csr.index[s] not in self._rows and self.csr.index[s] not in self._pinned]
+        if missing:
+            distances, predecessors = self.csr.shortest_paths(missing, workers=workers)
+            for k, i in enumerate(missing):
+                self._store(i, (distances[k], predecessors[k]))
+            self.misses += len(missing)
+
+    def search(self, source):
+        distances, predecessors = self._row(source)
+        return NodeArray(self.csr, distances, np.inf), NodeArray(self.csr, predecessors, NO_PREDECESSOR)
+
+    def distance(self, source, target):
+        distance = self._row(source)[0][self.csr.index[target]]
+        if distance == np.inf:
+            raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+        return float(distance)
+
+    def path(self, source, target):
+        predecessors = self._row(source)[1]
+        path = self.csr.unwind(predecessors, self.csr.index[source], self.csr.index[target])
+        return [self.csr.node_ids[i] for i in path]
+
+    def shortest_path(self, source, target):
+        return self.distance(source, target), self.path(source, target)
+
+    def distances(self, source, targets):
+        # Vectorised distances from source to a list of target ids (inf when unreachable)
+        return self._row(source)[0][self.csr.to_index(targets)]
+
+    def update_edge(self, csr, u, v, weight=None):
+        # Switches to csr, a fresh snapshot of the same nodes after graph[u][v]
+        # changed (weight None: removed), and drops only the rows whose tree used
+        # the edge or gets shorter through it, pinned ones included. Returns how many.
+        a, b = self.csr.index[u], self.csr.index[v]
+        edges = [(a, b)] if self.csr.directed else [(a, b), (b, a)]
+        dropped = 0
+        for rows in (self._rows, self._pinned):
+            stale = [i for i, (distances, predecessors) in rows.items()
+                     if any(predecessors[y] == x or (weight is not None and distances[x] + weight < distances[y])
+                            for x, y in edges)]
+            for i in stale:
+                del rows[i]
+            dropped += len(stale)
+        self.csr = csr
+        return dropped
+
+    def clear(self):
+        self._rows.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._rows), 'maxsize': self.maxsize,
+                'pinned': len(self._pinned)}
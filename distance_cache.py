@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import networkx as nx
+
+from csr_graph import CSRPathCache, NodeArray, NO_PREDECESSOR, csr_graph
+from graph_binary import content_hash
+
+# Shortest-path trees from frequently used nodes (hospitals, stations, ...) to
+# every node, kept on disk between runs. Files live under
+#   <cache_dir>/<content hash of the graph>/<name>[.reverse].{distances,predecessors}.npy
+# plus <name>[.reverse].json listing the sources, so a graph whose nodes, edges or
+# weights change gets a new directory and never sees stale trees. The .npy files
+# are memory-mapped on load: a warm run reads only the rows it touches.
+DEFAULT_CACHE_DIR = '.distance_cache'
+KEEP_GRAPHS = 16  # Hash directories kept per cache_dir (room for the period graphs of travel_profiles.py), least recently used ones are removed
+
+
+class SourceTrees:
+    # distances[k] and predecessors[k] are the csgraph rows of the search from
+    # sources[k]. For reverse trees they hold distances *to* sources[k] and the
+    # next hop towards it. On undirected graphs the two are the same.
+    def __init__(self, csr, sources, distances, predecessors, reverse=False):
+        self.csr = csr
+        self.sources = list(sources)
+        self.rows = {source: k for k, source in enumerate(self.sources)}
+        self.distances = distances
+        self.predecessors = predecessors
+        self.reverse = reverse
+
+    def distance(self, source, node):
+        distance = self.distances[self.rows[source], self.csr.index[node]]
+        if distance == np.inf:
+            ends = (node, source) if self.reverse else (source, node)
+            raise nx.NetworkXNoPath(f"No path from {ends[0]} to {ends[1]}")
+        return float(distance)
+
+    def path(self, source, node):
+        # source -> node, or node -> source for reverse trees
+        k = self.rows[source]
+        path = self.csr.unwind(self.predecessors[k], self.csr.index[source], self.csr.index[node])
+        if self.reverse:
+            path.reverse()
+        return [self.csr.node_ids[i] for i in path]
+
+    def distance_matrix(self, nodes):
+        # (len(sources), len(nodes)) array of distances, inf when unreachable
+        return self.distances[:, self.csr.to_index(nodes)]
+
+    def row(self, source):
+        # {node: distance} and {node: predecessor} views of one source
+        k = self.rows[source]
+        return NodeArray(self.csr, self.distances[k], np.inf), NodeArray(self.csr, self.predecessors[k], NO_PREDECESSOR)
+
+
+class DistanceCache:
+    # The persistent trees of one graph. trees() returns them from memory, then
+    # from disk, and only computes (one batched csgraph search) when neither has
+    # them for exactly these sources.
+    def __init__(self, graph, cache_dir=DEFAULT_CACHE_DIR):
+        self.csr = csr_graph(graph)
+        # graph_binary.load_csr already read the hash from the file header
+        self.key = getattr(self.csr, 'content_hash', None) or content_hash(self.csr)
+        self.cache_dir = cache_dir
+        self.directory = os.path.join(cache_dir, self.key)
+        self._trees = {}  # (name, reverse) -> SourceTrees
+        self.hits = 0  # Tree sets read from disk
+        self.misses = 0  # Tree sets computed
+
+    def trees(self, name, sources, reverse=False):
+        sources = list(sources)
+        trees = self._trees.get((name, reverse))
+        if trees is not None and trees.sources == sources:
+            return trees
+        # Undirected reverse trees are the forward ones, read in the other direction
+        base = os.path.join(self.directory, name + ('.reverse' if reverse and self.csr.directed else ''))
+        trees = self._load(base, sources, reverse)
+        if trees is None:
+            self.misses += 1
+            distances, predecessors = self.csr.shortest_paths(self.csr.to_index(sources), reverse=reverse)
+            self._save(base, sources, distances, predecessors.astype(np.int32))
+            trees = self._load(base, sources, reverse)
+        else:
+            self.hits += 1
+        self._trees[(name, reverse)] = trees
+        return trees
+
+    def _load(self, base, sources, reverse):
+        try:
+            with open(base + '.json') as f:
+                if json.load(f)['sources'] != sources:
+                    return None
+            distances = np.load(base + '.distances.npy', mmap_mode='r')
+            predecessors = np.load(base + '.predecessors.npy', mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        if distances.shape != (len(sources), len(self.csr)) or predecessors.shape != distances.shape:
+            return None
+        os.utime(self.directory)  # Mark the graph as recently used for _prune
+        return SourceTrees(self.csr, sources, distances, predecessors, reverse)
+
+    def _save(self, base, sources, distances, predecessors):
+        os.makedirs(self.directory, exist_ok=True)
+        # Arrays first, each renamed into place, and the source list last: a run
+        # interrupted half-way leaves a set that _load rejects, not a corrupt one
+        for suffix, array in (('.distances.npy', distances), ('.predecessors.npy', predecessors)):
+            with open(base + suffix + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(base + suffix + '.tmp', base + suffix)
+        with open(base + '.json.tmp', 'w') as f:
+            json.dump({'sources': sources, 'n_nodes': len(self.csr)}, f)
+        os.replace(base + '.json.tmp', base + '.json')
+        self._prune()
+
+    def _prune(self):
+        directories = [os.path.join(self.cache_dir, d) for d in os.listdir(self.cache_dir)]
+        directories = sorted((d for d in directories if os.path.isdir(d)), key=os.path.getmtime, reverse=True)
+        for directory in directories[KEEP_GRAPHS:]:
+            if directory != self.directory:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def hospitals(self):
+        # Reverse trees of the 'H' nodes: distance and next hop to each hospital
+        return self.trees('hospitals', self._nodes_of_type('H'), reverse=True)
+
+    def stations(self):
+        return self.trees('stations', self._nodes_of_type('A'))
+
+    def _nodes_of_type(self, node_type):
+        return [self.csr.node_ids[i] for i in self.csr.nodes_of_type(node_type).tolist()]
+
+    def path_cache(self, maxsize=128):
+        # CSRPathCache that answers from every forward tree set loaded so far
+        # without searching, and caches other sources as usual
+        path_cache = CSRPathCache(self.csr, maxsize)
+        for (name, reverse), trees in self._trees.items():
+            if not reverse or not self.csr.directed:
+                path_cache.pin(trees.sources, trees.distances, trees.predecessors)
+        return path_cache
+
+
+def distance_cache(graph, cache_dir=DEFAULT_CACHE_DIR):
+    # Enables the persistent cache for this graph: hospital_distance_table and the
+    # 'csgraph' routing engine pick it up from graph.graph['distance_cache']
+    cache = graph.graph.get('distance_cache')
+    if cache is None or cache.cache_dir != cache_dir:
+        cache = DistanceCache(graph, cache_dir)
+        graph.graph['distance_cache'] = cache
+    return cache
+
+
+def main(argv=None):
+    from create_graph import recreate_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Precompute the hospital and station shortest-path trees of a graph")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--sources', nargs='+', default=[], help="more nodes to cache trees for, stored as 'extra'")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    start = time.perf_counter()
+    cache = distance_cache(G, args.cache_dir)
+    cache.hospitals()
+    cache.stations()
+    if args.sources:
+        cache.trees('extra', args.sources)
+    print(f"{cache.misses} tree sets computed, {cache.hits} loaded from {cache.directory} "
+          f"in {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+
+# Event kinds. When several events share a timestamp they are handled in this
+# order, which mirrors one iteration of the tick loop in run_simulation:
+# new calls first, then fleet updates, then a retry of the queue.
+CALL_ARRIVAL = 0
+AMBULANCE_AT_NODE = 1
+AMBULANCE_FREE = 2
+QUEUE_RETRY = 3
+# Road changes are pulled from a RoadUpdates (road_updates.py) like calls from
+# the CallSchedule, ahead of everything else at the same time
+ROAD_CHANGE = 4
+
+
+class EventQueue:
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()  # Tie breaker so payloads are never compared
+        self._scheduled = set()  # (time, kind, payload) already on the heap
+
+    def push(self, time, kind, payload=None):
+        key = (time, kind, payload)
+        if key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        heapq.heappush(self._heap, (time, kind, next(self._counter), payload))
+
+    def pop(self):
+        time, kind, _, payload = heapq.heappop(self._heap)
+        self._scheduled.discard((time, kind, payload))
+        return time, kind, payload
+
+    def peek_time(self):
+        return self._heap[0][0]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+def run_event_simulation(dispatcher, call_schedule, until=None, road_updates=None):
+    # Discrete-event counterpart of AmbulanceDispatch.run_simulation. Instead of
+    # stepping current_time by 1, jump straight to the next timestamped event, so
+    # the cost depends on the number of events and not on the simulated horizon.
+    # Calls are pulled from the CallSchedule as they come due rather than being
+    # pushed onto the heap up front, so a streamed schedule stays streamed.
+    events = EventQueue()
+
+    while True:
+        next_call = call_schedule.peek_time()
+        next_event = events.peek_time() if events else None
+        next_road = road_updates.next_time() if road_updates is not None else None
+        if next_call is None and next_event is None and next_road is None:
+            break
+        if next_road is not None and all(t is None or next_road <= t for t in (next_call, next_event)):
+            time, kind = next_road, ROAD_CHANGE
+        elif next_call is not None and (next_event is None or next_call <= next_event):
+            time, kind = next_call, CALL_ARRIVAL
+        else:
+            time, kind = next_event, None
+        # Same horizon as the tick loop: stop 1000 time units after the last call
+        horizon = until
+        if horizon is None and next_call is None:
+            horizon = call_schedule.last_time + 1000 if call_schedule.last_time is not None else time
+        if horizon is not None and time > horizon:
+            break
+
+        # Never move the clock backwards, fleet events can be overtaken by a dispatch
+        dispatcher.current_time = max(dispatcher.current_time, time)
+        if kind == CALL_ARRIVAL:
+            for patient_id, call in call_schedule.pop_due(time):
+                dispatcher.handle_call(patient_id, call)
+        elif kind == ROAD_CHANGE:
+            road_updates.apply_due(time)
+        else:
+            time, kind, payload = events.pop()
+            if kind == QUEUE_RETRY:
+                dispatcher.process_queued_requests()
+            else:
+                dispatcher.update_available_ambulances()
+
+        if kind != QUEUE_RETRY and dispatcher.priority_queue and dispatcher.available_ambulances:
+            events.push(dispatcher.current_time, QUEUE_RETRY)
+
+        # Schedule whatever the fleet will do next (duplicates are ignored)
+        for event_time, event_kind in dispatcher.upcoming_fleet_events():
+            events.push(max(event_time, dispatcher.current_time), event_kind)
@@ -0,0 +1,82 @@
+import numpy as np
+
+# Ambulance status codes
+FREE = 0
+BUSY = 1
+
+NO_NODE = -1
+
+
+class FleetState:
+    # Struct-of-arrays view of the fleet: one NumPy column per attribute and
+    # one row per ambulance. Status changes are in-place writes, and questions
+    # like "who is free now" or "who finishes by time t" are single vectorised
+    # expressions instead of Python loops over tuples and dicts.
+    def __init__(self, graph, ambulance_data):
+        self.node_ids = list(graph.nodes)
+        self.node_index = {node: i for i, node in enumerate(self.node_ids)}
+        self.ambulance_ids = list(ambulance_data)
+        self.row = {ambulance_id: i for i, ambulance_id in enumerate(self.ambulance_ids)}
+        n = len(self.ambulance_ids)
+
+        self.status = np.full(n, FREE, dtype=np.int8)
+        self.node = np.array([self.node_index[data[2]] for data in ambulance_data.values()], dtype=np.int32)
+        self.edge_from = np.full(n, NO_NODE, dtype=np.int32)  # Edge being traversed, NO_NODE when parked
+        self.edge_to = np.full(n, NO_NODE, dtype=np.int32)
+        self.edge_entered = np.full(n, np.nan)  # Time the current edge was entered
+        self.available_at = np.zeros(n)  # Time a busy ambulance becomes free
+        self.patient = np.full(n, -1, dtype=np.int64)
+        self.hospital = np.full(n, NO_NODE, dtype=np.int32)
+
+    def assign(self, ambulance_id, node, available_at, patient_id, hospital_node):
+        i = self.row[ambulance_id]
+        self.status[i] = BUSY
+        self.node[i] = self.node_index[node]
+        self.available_at[i] = available_at
+        self.patient[i] = patient_id if isinstance(patient_id, (int, np.integer)) else -1
+        self.hospital[i] = self.node_index.get(hospital_node, NO_NODE)
+
+    def reschedule(self, ambulance_id, available_at):
+        # A busy ambulance that was rerouted frees up at a different time
+        self.available_at[self.row[ambulance_id]] = available_at
+
+    def release(self, ambulance_id, node):
+        i = self.row[ambulance_id]
+        self.status[i] = FREE
+        self.node[i] = self.node_index[node]
+        self.edge_from[i] = self.edge_to[i] = NO_NODE
+        self.edge_entered[i] = np.nan
+        self.patient[i] = -1
+        self.hospital[i] = NO_NODE
+
+    def move(self, ambulance_id, node, time, next_node=None):
+        # The ambulance reached node at time and, if next_node is given, starts along that edge
+        i = self.row[ambulance_id]
+        self.node[i] = self.node_index[node]
+        if next_node is None:
+            self.edge_from[i] = self.edge_to[i] = NO_NODE
+            self.edge_entered[i] = np.nan
+        else:
+            self.edge_from[i] = self.node[i]
+            self.edge_to[i] = self.node_index[next_node]
+            self.edge_entered[i] = time
+
+    def due(self, time):
+        # Busy ambulances that are free again by time, earliest first
+        rows = np.flatnonzero((self.status == BUSY) & (self.available_at <= time))
+        rows = rows[np.argsort(self.available_at[rows], kind='stable')]
+        return [self.ambulance_ids[i] for i in rows]
+
+    def free_ids(self):
+        return [self.ambulance_ids[i] for i in np.flatnonzero(self.status == FREE)]
+
+    def free_count(self):
+        return int(np.count_nonzero(self.status == FREE))
+
+    def next_free_time(self):
+        # Earliest time a busy ambulance becomes free, None when nobody is busy
+        busy = self.status == BUSY
+        return float(self.available_at[busy].min()) if busy.any() else None
+
+    def node_of(self, ambulance_id):
+        return self.node_ids[self.node[self.row[ambulance_id]]]
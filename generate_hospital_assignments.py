@@ -1,37 +1,45 @@
+import argparse
 import networkx as nx
+import numpy as np
 from create_graph import recreate_graph_from_file
+from routing import Router, ENGINES
+from voronoi import VoronoiPartition
 
-def dijkstra(graph, start):
-    distances = {node: float('inf') for node in graph.nodes()}
-    distances[start] = 0
-    previous_nodes = {}
-
-    unvisited_nodes = set(graph.nodes())
-
-    while unvisited_nodes:
-        current_node = min(unvisited_nodes, key=lambda node: distances[node])
-
-        unvisited_nodes.remove(current_node)
-
-        for neighbor, weight in graph[current_node].items():
-            new_distance = distances[current_node] + weight['weight']
-            if new_distance < distances[neighbor]:
-                distances[neighbor] = new_distance
-                previous_nodes[neighbor] = current_node
-
-    return distances, previous_nodes
-
-def assign_hospitals_to_patients(graph):
+def assign_hospitals_to_patients(graph, engine=None, hierarchy=None, cache=None, partition=None):
+    # Patients that reach no hospital are left out, whichever way the distances are found.
+    # partition: a VoronoiPartition of the hospitals already built by the caller
     assignments = {}
     patients = [node for node in graph.nodes() if node.startswith('E')]
     hospitals = [node for node in graph.nodes() if node.startswith('H')]
+    if not hospitals:
+        return assignments
 
-    for patient_location in patients:
-        distances_to_hospitals, previous_nodes = dijkstra(graph, patient_location)
-        optimal_hospital = min(hospitals, key=lambda h: distances_to_hospitals[h])
-        assignments[patient_location] = optimal_hospital
+    if cache is not None:
+        # Nearest hospital per patient straight from the persistent hospital trees (distance_cache.py)
+        distances = cache.trees('hospitals', hospitals, reverse=True).distance_matrix(patients)
+        reachable = np.flatnonzero(np.isfinite(distances).any(axis=0))
+        nearest = distances[:, reachable].argmin(axis=0).tolist()
+        return {patients[i]: hospitals[k] for i, k in zip(reachable.tolist(), nearest)}
 
-    return assignments
+    if engine is not None:
+        # One point-to-point query per patient and hospital with the selected routing engine
+        router = Router(graph, engine=engine, hierarchy=hierarchy)
+        for patient_location in patients:
+            distances_to_hospitals = {}
+            for hospital in hospitals:
+                try:
+                    distances_to_hospitals[hospital] = router.distance(patient_location, hospital)
+                except nx.NetworkXNoPath:
+                    distances_to_hospitals[hospital] = float('inf')
+            nearest = min(hospitals, key=lambda h: distances_to_hospitals[h])
+            if distances_to_hospitals[nearest] < float('inf'):
+                assignments[patient_location] = nearest
+        return assignments
+
+    # One multi-source Dijkstra from every hospital gives the nearest one for all patients at once
+    if partition is None:
+        partition = VoronoiPartition(graph, hospitals)
+    return partition.assignments(patients)
 
 def save_assignments_to_file(assignments, file_path):
     with open(file_path, 'w') as f:
@@ -39,23 +47,47 @@ def save_assignments_to_file(assignments, file_path):
         for patient_location, assigned_hospital in assignments:
             f.write(f"{patient_location} assigned to {assigned_hospital}\n")
 
-# Usage:
-file_path = 'graph_structure.txt'
-G = recreate_graph_from_file(file_path)
+def main(argv=None):
+    from distance_cache import distance_cache, DEFAULT_CACHE_DIR  # SciPy, only needed by the CLI
+
+    parser = argparse.ArgumentParser(description="Assign the nearest hospital to every emergency node")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--engine', default=None, choices=ENGINES,
+                        help="point-to-point routing engine (default: one multi-source Dijkstra from all hospitals)")
+    parser.add_argument('--hierarchy', default=None, help="saved contraction hierarchy for --engine ch")
+    parser.add_argument('--cache-dir', default=None, nargs='?', const=DEFAULT_CACHE_DIR,
+                        help=f"read the hospital trees from a persistent distance cache (default dir {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--npz', default=None,
+                        help="also save nearest hospital, distance and next hop of every node as .npz")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    cache = distance_cache(G, args.cache_dir) if args.cache_dir and not args.engine else None
+
+    # The .npz is the hospital partition, which then also gives the assignments
+    partition = VoronoiPartition(G, [node for node in G.nodes if node.startswith('H')]) if args.npz else None
+
+    # Assign hospitals to patients based on shortest distance
+    hospital_assignments = assign_hospitals_to_patients(G, engine=args.engine, hierarchy=args.hierarchy, cache=cache,
+                                                        partition=partition)
+    if args.npz:
+        partition.save(args.npz)
+        print("Nearest hospital of every node saved to", args.npz)
+
+    # Store the assignments in a list
+    assignment_list = []
+    for patient_location, assigned_hospital in hospital_assignments.items():
+        assignment_list.append((patient_location, assigned_hospital))
 
-# Assign hospitals to patients based on shortest distance
-hospital_assignments = assign_hospitals_to_patients(G)
+    # Save assignments to a file
+    output_file_path = 'hospital_assignments.txt'
+    save_assignments_to_file(assignment_list, output_file_path)
 
-# Store the assignments in a list
-assignment_list = []
-for patient_location, assigned_hospital in hospital_assignments.items():
-    assignment_list.append((patient_location, assigned_hospital))
+    print("Hospital assignments have been saved to", output_file_path)
+    print("Assignment of Hospitals to Patients:")
+    for patient_location, assigned_hospital in hospital_assignments.items():
+        print(patient_location, "assigned to", assigned_hospital)
 
-# Save assignments to a file
-output_file_path = 'hospital_assignments.txt'
-save_assignments_to_file(assignment_list, output_file_path)
 
-print("Hospital assignments have been saved to", output_file_path)
-print("Assignment of Hospitals to Patients:")
-for patient_location, assigned_hospital in hospital_assignments.items():
-    print(patient_location, "assigned to", assigned_hospital)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
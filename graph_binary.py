@@ -0,0 +1,225 @@
+import argparse
+import hashlib
+import struct
+import time
+from collections.abc import Sequence
+
+import numpy as np
+import networkx as nx
+
+from csr_graph import CSRGraph
+
+# File layout: a 256-byte header, then the sections below, each starting on a
+# 64-byte boundary so every array can be memory-mapped in place:
+#   coords f8 (n, 2) | node_types u1 (n) | indptr i4 (n + 1) | indices i4 (m)
+#   | weights f8 (m) | node ids, utf-8, '\n'-separated
+# The header holds a SHA-256 of the sections, which identifies the graph
+# contents (distance_cache.py keys its files on it).
+MAGIC = b'AMBGRAPH'
+VERSION = 1
+ALIGNMENT = 64
+HEADER_SIZE = 256
+HEADER = struct.Struct('<8sIIQQ6Q32s')  # magic, version, flags, n, m, 6 section offsets, digest
+FLAG_DIRECTED = 1
+
+
+def _sections(csr):
+    return [
+        np.ascontiguousarray(csr.coords, dtype='<f8'),
+        np.frombuffer(''.join(csr.node_types.tolist()).encode('ascii'), dtype=np.uint8),
+        np.ascontiguousarray(csr.indptr, dtype='<i4'),
+        np.ascontiguousarray(csr.indices, dtype='<i4'),
+        np.ascontiguousarray(csr.weights, dtype='<f8'),
+        np.frombuffer('\n'.join(csr.node_ids).encode('utf-8'), dtype=np.uint8),
+    ]
+
+
+def content_hash(csr):
+    # Hex SHA-256 of the graph contents, the same whether computed here or read from a file header
+    digest = hashlib.sha256()
+    for section in _sections(csr):
+        digest.update(section.tobytes())
+    return digest.hexdigest()
+
+
+def write_graph(csr, file_path):
+    sections = _sections(csr)
+    digest = hashlib.sha256()
+    offsets = []
+    offset = HEADER_SIZE
+    for section in sections:
+        digest.update(section.tobytes())
+        offsets.append(offset)
+        offset += -(-section.nbytes // ALIGNMENT) * ALIGNMENT
+    flags = FLAG_DIRECTED if csr.directed else 0
+    header = HEADER.pack(MAGIC, VERSION, flags, len(csr), len(csr.indices), *offsets, digest.digest())
+    with open(file_path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\0'))
+        for section, start in zip(sections, offsets):
+            f.seek(start)
+            section.tofile(f)
+        f.truncate(offsets[-1] + sections[-1].nbytes)
+    return digest.hexdigest()
+
+
+class NodeIdTable(Sequence):
+    # The '\n'-separated id section, split into a list the first time an id is needed
+    def __init__(self, raw, n):
+        self._raw = raw
+        self._n = n
+        self._ids = None
+
+    def _load(self):
+        if self._ids is None:
+            self._ids = self._raw.tobytes().decode('utf-8').split('\n') if self._n else []
+        return self._ids
+
+    def __getitem__(self, i):
+        return self._load()[i]
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        return iter(self._load())
+
+
+def read_header(file_path):
+    with open(file_path, 'rb') as f:
+        raw = f.read(HEADER.size)
+    magic, version, flags, n, m, *rest = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"{file_path} is not a binary graph file")
+    if version != VERSION:
+        raise ValueError(f"{file_path} has format version {version}, expected {VERSION}")
+    return {'n_nodes': n, 'n_entries': m, 'directed': bool(flags & FLAG_DIRECTED),
+            'offsets': rest[:6], 'hash': rest[6].hex()}
+
+
+def is_binary_graph(file_path):
+    with open(file_path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def load_csr(file_path, verify=False):
+    # CSRGraph whose arrays are read-only views into a memory map of the file:
+    # nothing is parsed or copied, and processes opening the same file share the
+    # pages through the OS cache. verify=True re-hashes the contents first.
+    header = read_header(file_path)
+    n, m, offsets = header['n_nodes'], header['n_entries'], header['offsets']
+    data = np.memmap(file_path, dtype=np.uint8, mode='r')
+    sizes = (16 * n, n, 4 * (n + 1), 4 * m, 8 * m, len(data) - offsets[-1])  # The ids run to the end of the file
+    dtypes = ('<f8', np.uint8, '<i4', '<i4', '<f8', np.uint8)
+    coords, node_types, indptr, indices, weights, id_bytes = [
+        data[start:start + size].view(dtype) for start, size, dtype in zip(offsets, sizes, dtypes)]
+    if verify:
+        digest = hashlib.sha256()
+        for array in (coords, node_types, indptr, indices, weights, id_bytes):
+            digest.update(array.tobytes())
+        if digest.hexdigest() != header['hash']:
+            raise ValueError(f"{file_path} is corrupt: content hash mismatch")
+    csr = CSRGraph(NodeIdTable(id_bytes, n), node_types.view('S1').astype('U1'), coords.reshape(n, 2),
+                   indptr, indices, weights, directed=header['directed'])
+    csr.content_hash = header['hash']
+    return csr
+
+
+def to_networkx(csr):
+    # The networkx graph recreate_graph_from_file would build, with the CSRGraph
+    # attached so csr_graph() and the csgraph engine reuse the memory map
+    graph = nx.DiGraph() if csr.directed else nx.Graph()
+    node_ids = list(csr.node_ids)
+    types = csr.node_types.tolist()
+    coords = csr.coords.tolist()
+    graph.add_nodes_from((node, {'pos': tuple(coords[i]), 'node_type': types[i]}) for i, node in enumerate(node_ids))
+    sources = np.repeat(np.arange(len(csr), dtype=np.int32), np.diff(csr.indptr))
+    keep = slice(None) if csr.directed else sources < csr.indices  # Each undirected road once
+    graph.add_weighted_edges_from(zip(
+        (node_ids[i] for i in sources[keep].tolist()),
+        (node_ids[j] for j in csr.indices[keep].tolist()),
+        csr.weights[keep].tolist()))
+    graph.graph['csr_graph'] = csr
+    return graph
+
+
+def load_graph(file_path):
+    return to_networkx(load_csr(file_path))
+
+
+def is_raw_export(file_path):
+    # The raw export (ujjain_map_data.txt) also starts with a node count, so
+    # tell them apart by the node ids: the counted formats number their nodes
+    # 0..n-1 in file order ('E 12 x y' from city.py, 'E12 x y' from
+    # create_graph2.save_graph_to_file), the export keeps the OSM ids
+    with open(file_path) as f:
+        first = f.readline().strip()
+        if not first.isdigit():
+            return True
+        for index in range(int(first)):
+            parts = f.readline().split()
+            if len(parts) == 4:
+                return False  # city.py: 'E 12 x y'
+            if len(parts) != 3 or parts[0][1:] != str(index):
+                return True
+    return False
+
+
+def read_text_graph(file_path):
+    # networkx graph from either text format: the counted node list of
+    # graph_structure.txt / new_Ujjain.txt, or the raw ujjain_map_data.txt
+    # export, renumbered exactly like create_graph2.py does for new_Ujjain.txt
+    if not is_raw_export(file_path):
+        from create_graph import recreate_graph_from_file
+        return recreate_graph_from_file(file_path)
+    from create_graph2 import recreate_graph_from_file as read_raw
+    raw, _ = read_raw(file_path)
+    graph = nx.relabel_nodes(raw, {node: f"{data['node_type'][0]}{node}" for node, data in raw.nodes(data=True)})
+    for _, data in graph.nodes(data=True):
+        data['node_type'] = data['node_type'][0]
+    return graph
+
+
+def compare_nodes(csr, reference_path):
+    # Differences in node count and ids against another text graph, e.g. the
+    # raw export against the new_Ujjain.txt create_graph2.py wrote from it
+    reference = read_text_graph(reference_path)
+    problems = []
+    if len(csr) != reference.number_of_nodes():
+        problems.append(f"{len(csr)} nodes, {reference_path} has {reference.number_of_nodes()}")
+    if list(csr.node_ids) != list(reference.nodes):
+        missing = set(reference.nodes) - set(csr.node_ids)
+        extra = set(csr.node_ids) - set(reference.nodes)
+        problems.append(f"node ids differ: {len(missing)} missing, {len(extra)} extra, or in another order")
+    return problems
+
+
+def convert(text_path, binary_path):
+    csr = CSRGraph.from_networkx(read_text_graph(text_path))
+    return csr, write_graph(csr, binary_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a text graph file to the memory-mappable binary format")
+    parser.add_argument('graph', help="graph_structure.txt, new_Ujjain.txt or ujjain_map_data.txt style file")
+    parser.add_argument('--out', default=None, help="output file (default: <graph>.bin)")
+    parser.add_argument('--compare', default=None, metavar='GRAPH',
+                        help="fail unless the nodes match this text graph, e.g. new_Ujjain.txt for ujjain_map_data.txt")
+    args = parser.parse_args(argv)
+
+    out = args.out or args.graph.rsplit('.', 1)[0] + '.bin'
+    start = time.perf_counter()
+    csr, digest = convert(args.graph, out)
+    print(f"{len(csr)} nodes, {len(csr.indices)} adjacency entries written to {out} in {time.perf_counter() - start:.2f} s")
+    print("content hash", digest)
+    if args.compare:
+        problems = compare_nodes(csr, args.compare)
+        if problems:
+            raise SystemExit(f"Nodes differ from {args.compare}: " + "; ".join(problems))
+        print(f"Same {len(csr)} node ids as {args.compare}")
+    start = time.perf_counter()
+    load_csr(out)
+    print(f"Memory-mapped load: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import networkx as nx
+
+from path_cache import tree_uses_edge
+
+
+class HospitalDistanceTable:
+    # Distance and next hop towards every hospital, for every node. The
+    # patient-to-hospital leg of a dispatch never changes during a run, so it is
+    # computed once per graph with one reverse Dijkstra per hospital.
+    def __init__(self, graph, hospitals=None, weight='weight'):
+        self.graph = graph
+        if hospitals is None:
+            hospitals = [node for node in graph.nodes if str(node).startswith('H')]
+        self.hospitals = list(hospitals)
+        self.weight = weight
+        self.distances = {}  # hospital -> {node: distance to hospital}
+        self.next_hop = {}  # hospital -> {node: next node on the way to hospital}
+        for hospital in self.hospitals:
+            self._search(hospital)
+
+    def _search(self, hospital):
+        # Searching from the hospital on the reversed graph gives distances *to* the hospital
+        reverse = self.graph.reverse(copy=False) if self.graph.is_directed() else self.graph
+        pred, distances = nx.dijkstra_predecessor_and_distance(reverse, hospital, weight=self.weight)
+        self.distances[hospital] = distances
+        self.next_hop[hospital] = {node: parents[0] for node, parents in pred.items() if parents}
+
+    @classmethod
+    def from_trees(cls, graph, trees):
+        # Table backed by the (possibly memory-mapped) reverse hospital trees of
+        # distance_cache.py instead of fresh searches
+        table = cls.__new__(cls)
+        table.graph = graph
+        table.hospitals = list(trees.sources)
+        table.weight = 'weight'
+        table.distances = {}
+        table.next_hop = {}
+        for hospital in table.hospitals:
+            table.distances[hospital], table.next_hop[hospital] = trees.row(hospital)
+        return table
+
+    def update_edge(self, u, v, weight=None):
+        # Called after graph[u][v] changed (weight None: removed). Searches again
+        # only for the hospitals whose tree used the edge or gets shorter through
+        # it, and returns them. Rows read from the distance cache become dicts.
+        edges = [(v, u)] if self.graph.is_directed() else [(v, u), (u, v)]
+        stale = [hospital for hospital in self.hospitals
+                 if tree_uses_edge(self.distances[hospital], self.next_hop[hospital], edges, weight)]
+        for hospital in stale:
+            self._search(hospital)
+        return stale
+
+    def distance(self, node, hospital):
+        if hospital not in self.distances:
+            # A patient without an assigned hospital ("Unknown") is queued again
+            # like an unreachable one, so the callers only handle NetworkXNoPath
+            raise nx.NetworkXNoPath(f"{hospital} is not a hospital of this table")
+        distances = self.distances[hospital]
+        if node not in distances:
+            raise nx.NetworkXNoPath(f"No path from {node} to {hospital}")
+        return distances[node]
+
+    def path(self, node, hospital):
+        self.distance(node, hospital)  # Raise the same errors as distance()
+        next_hop = self.next_hop[hospital]
+        path = [node]
+        while path[-1] != hospital:
+            path.append(next_hop[path[-1]])
+        return path
+
+
+def hospital_distance_table(graph):
+    # One table per graph, kept on the graph itself so every dispatcher reuses it.
+    # With a persistent distance cache enabled (distance_cache.py) it is read from disk.
+    table = graph.graph.get('hospital_distance_table')
+    if table is None:
+        cache = graph.graph.get('distance_cache')
+        table = HospitalDistanceTable(graph) if cache is None else HospitalDistanceTable.from_trees(graph, cache.hospitals())
+        graph.graph['hospital_distance_table'] = table
+    return table
@@ -0,0 +1,156 @@
+import argparse
+import time
+
+from voronoi import VoronoiPartition
+
+
+class FacilityAssignments:
+    # The hospital and station Voronoi partitions of one graph, kept up to date
+    # while hospitals and stations open, close or move and roads change. Every
+    # change repairs only the affected cells and returns the rows of
+    # hospital_assignments.txt and hospital_to_station_mapping.txt that changed, as
+    #   {'hospital_assignments': {patient: hospital or None},
+    #    'station_mapping': {hospital: (station, travel time, path) or None}}
+    # where None means the row is gone.
+    def __init__(self, graph, hospitals=None, stations=None, weight='weight'):
+        self.graph = graph
+        if hospitals is None:
+            hospitals = [node for node in graph.nodes if node.startswith('H')]
+        if stations is None:
+            stations = [node for node in graph.nodes if node.startswith('A')]
+        self.hospitals = VoronoiPartition(graph, hospitals, weight)
+        self.stations = VoronoiPartition(graph, stations, weight)
+
+    def is_patient(self, node):
+        # The emergency nodes listed in hospital_assignments.txt
+        return node.startswith('E')
+
+    def hospital_assignments(self):
+        return self.hospitals.assignments([node for node in self.graph.nodes if self.is_patient(node)])
+
+    def station_mapping(self):
+        return {hospital: self.station_row(hospital) for hospital in self.hospitals.facilities
+                if hospital in self.stations.owner}
+
+    def station_row(self, hospital):
+        return self.stations.owner[hospital], self.stations.distance[hospital], self.stations.path(hospital)
+
+    def _hospital_changes(self, changed, opened=(), closed=()):
+        rows = {node: self.hospitals.owner.get(node) for node in changed if self.is_patient(node)}
+        mapping = {hospital: None for hospital in closed}
+        mapping.update((hospital, self.station_row(hospital)) for hospital in opened if hospital in self.stations.owner)
+        return {'hospital_assignments': rows, 'station_mapping': mapping}
+
+    def _station_changes(self, changed):
+        # A hospital's path runs through its own cell, so its row changes exactly when it is relabelled
+        mapping = {node: self.station_row(node) if node in self.stations.owner else None
+                   for node in changed if node in self.hospitals.rank}
+        return {'hospital_assignments': {}, 'station_mapping': mapping}
+
+    def add_hospital(self, node):
+        return self._hospital_changes(self.hospitals.add_facility(node), opened=[node])
+
+    def remove_hospital(self, node):
+        return self._hospital_changes(self.hospitals.remove_facility(node), closed=[node])
+
+    def move_hospital(self, old, new):
+        return self._hospital_changes(self.hospitals.move_facility(old, new), opened=[new], closed=[old])
+
+    def add_station(self, node):
+        return self._station_changes(self.stations.add_facility(node))
+
+    def remove_station(self, node):
+        return self._station_changes(self.stations.remove_facility(node))
+
+    def move_station(self, old, new):
+        return self._station_changes(self.stations.move_facility(old, new))
+
+    def update_edge(self, u, v, weight=None):
+        # A road changed (weight None: closed), which can move cells of both partitions
+        changes = self._hospital_changes(self.hospitals.update_edge(u, v, weight))
+        return merge_changes(changes, self._station_changes(self.stations.update_edge(u, v, weight)))
+
+
+def merge_changes(changes, more):
+    # Later rows win, so a sequence of changes reduces to one set of rows
+    for key in changes:
+        changes[key].update(more[key])
+    return changes
+
+
+def hospital_assignment_line(patient, hospital):
+    return f"{patient} assigned to {hospital}"
+
+
+def station_mapping_line(hospital, row):
+    station, travel_time, path = row
+    return f"{hospital} assigned to {station}, Travel Time: {travel_time}, path: {path}"
+
+
+def apply_changes(changes, assignment_file='hospital_assignments.txt', mapping_file='hospital_to_station_mapping.txt'):
+    # Rewrites both files with the changed rows replaced, added or dropped, in
+    # the formats of generate_hospital_assignments.py and Ambulance_station_assignement.py
+    for file_path, rows, format_line in ((assignment_file, changes['hospital_assignments'], hospital_assignment_line),
+                                         (mapping_file, changes['station_mapping'], station_mapping_line)):
+        with open(file_path) as f:
+            header = next(f)
+            lines = {line.split(' assigned to ')[0]: line.rstrip('\n') for line in f if line.strip()}
+        for key, row in rows.items():
+            if row is None:
+                lines.pop(key, None)
+            else:
+                lines[key] = format_line(key, row)
+        with open(file_path, 'w') as f:
+            f.write(header)
+            for line in lines.values():
+                f.write(line + "\n")
+
+
+def main(argv=None):
+    from create_graph import recreate_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Update the hospital and station assignments after facility changes")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--add-hospital', action='append', default=[], metavar='NODE')
+    parser.add_argument('--remove-hospital', action='append', default=[], metavar='NODE')
+    parser.add_argument('--move-hospital', nargs=2, action='append', default=[], metavar=('OLD', 'NEW'))
+    parser.add_argument('--add-station', action='append', default=[], metavar='NODE')
+    parser.add_argument('--remove-station', action='append', default=[], metavar='NODE')
+    parser.add_argument('--move-station', nargs=2, action='append', default=[], metavar=('OLD', 'NEW'))
+    parser.add_argument('--apply', action='store_true',
+                        help="rewrite hospital_assignments.txt and hospital_to_station_mapping.txt with the changes")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    assignments = FacilityAssignments(G)
+    settled = assignments.hospitals.settled + assignments.stations.settled
+    start = time.perf_counter()
+    changes = {'hospital_assignments': {}, 'station_mapping': {}}
+    for node in args.add_hospital:
+        merge_changes(changes, assignments.add_hospital(node))
+    for node in args.remove_hospital:
+        merge_changes(changes, assignments.remove_hospital(node))
+    for old, new in args.move_hospital:
+        merge_changes(changes, assignments.move_hospital(old, new))
+    for node in args.add_station:
+        merge_changes(changes, assignments.add_station(node))
+    for node in args.remove_station:
+        merge_changes(changes, assignments.remove_station(node))
+    for old, new in args.move_station:
+        merge_changes(changes, assignments.move_station(old, new))
+    elapsed = time.perf_counter() - start
+    updated = assignments.hospitals.settled + assignments.stations.settled - settled
+
+    for patient, hospital in changes['hospital_assignments'].items():
+        print(f"removed {patient}" if hospital is None else hospital_assignment_line(patient, hospital))
+    for hospital, row in changes['station_mapping'].items():
+        print(f"removed {hospital}" if row is None else station_mapping_line(hospital, row))
+    print(f"{len(changes['hospital_assignments'])} assignment and {len(changes['station_mapping'])} station rows changed, "
+          f"{updated} of {G.number_of_nodes()} nodes relabelled in {elapsed * 1000:.1f} ms")
+    if args.apply:
+        apply_changes(changes)
+        print("hospital_assignments.txt and hospital_to_station_mapping.txt updated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+# AmbulanceDispatch methods timed when instrumentation is attached. Times are
+# inclusive: dispatch_ambulance also contains its find_nearby_ambulances call.
+PHASES = (
+    'run_simulation',
+    'process_calls_and_queue',
+    'handle_call',
+    'dispatch_ambulance',
+    'update_available_ambulances',
+    'process_queued_requests',
+    'find_nearby_ambulances',
+    'select_best_ambulance',
+)
+TRACE_METHODS = ('result', 'event', 'position', 'flush')  # Timed together as the 'trace' phase
+QUEUE_METHODS = {'queue_push': 'queue_pushes', 'queue_pop': 'queue_pops'}
+PATH_CACHE_COUNTERS = ('hits', 'misses', 'queries', 'settled')  # ShortestPathCache and Router attributes
+
+
+class Instrumentation:
+    # Phase timers and counters for one AmbulanceDispatch. attach() replaces the
+    # dispatcher's methods on the instance with timed wrappers, so a dispatcher
+    # built without instrumentation runs the plain methods and pays nothing.
+    # profiler is anything with start() and stop() (SamplingProfiler below, or
+    # e.g. a pyinstrument Profiler); it runs for the duration of run_simulation.
+    def __init__(self, profiler=None):
+        self.timers = {}  # Phase -> [calls, seconds]
+        self.counters = Counter()
+        self.profiler = profiler
+        self.dispatcher = None
+        self._path_cache_start = {}
+
+    def attach(self, dispatcher):
+        self.dispatcher = dispatcher
+        for name in PHASES:
+            method = getattr(dispatcher, name)
+            if name == 'run_simulation' and self.profiler is not None:
+                method = self._profiled(method)
+            setattr(dispatcher, name, self._timed(name, method))
+        for name, counter in QUEUE_METHODS.items():
+            setattr(dispatcher, name, self._counted(counter, getattr(dispatcher, name)))
+        for name in TRACE_METHODS:
+            setattr(dispatcher.trace, name, self._timed('trace', getattr(dispatcher.trace, name)))
+        self._path_cache_start = self._path_cache_counters()
+
+    def _timed(self, phase, method):
+        timer = self.timers.setdefault(phase, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                timer[0] += 1
+                timer[1] += perf_counter() - start
+        return wrapper
+
+    def _counted(self, counter, method):
+        counters = self.counters
+
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            counters[counter] += 1
+            return method(*args, **kwargs)
+        return wrapper
+
+    def _profiled(self, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            self.profiler.start()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.profiler.stop()
+        return wrapper
+
+    def _path_cache_counters(self):
+        path_cache = self.dispatcher.path_cache
+        return {name: getattr(path_cache, name) for name in PATH_CACHE_COUNTERS if hasattr(path_cache, name)}
+
+    def report(self):
+        # Structured summary of everything measured so far
+        path_cache = {name: value - self._path_cache_start.get(name, 0)
+                      for name, value in self._path_cache_counters().items()}
+        report = {
+            'phases': {
+                name: {'calls': calls, 'seconds': seconds, 'mean_us': seconds / calls * 1e6}
+                for name, (calls, seconds) in self.timers.items() if calls
+            },
+            'counters': dict(self.counters),
+            # hits/misses for ShortestPathCache (a miss is one full Dijkstra), queries/settled for Router
+            'path_cache': path_cache,
+        }
+        if self.profiler is not None and hasattr(self.profiler, 'report'):
+            report['profile'] = self.profiler.report()
+        return report
+
+
+def format_report(report):
+    lines = [f"{'phase':<28}{'calls':>10}{'seconds':>12}{'mean us':>12}"]
+    for name, row in sorted(report['phases'].items(), key=lambda item: -item[1]['seconds']):
+        lines.append(f"{name:<28}{row['calls']:>10}{row['seconds']:>12.4f}{row['mean_us']:>12.1f}")
+    for section in ('counters', 'path_cache'):
+        for name, value in sorted(report[section].items()):
+            lines.append(f"{name:<28}{value:>10}")
+    for row in report.get('profile', []):
+        lines.append(f"{row['self']:6.1%} self {row['total']:6.1%} total  {row['function']}")
+    return "\n".join(lines)
+
+
+class SamplingProfiler:
+    # Every `interval` seconds a background thread records the stack of the thread
+    # that called start(). The cost is one stack walk per sample, nothing per call,
+    # so it can stay on for long simulations.
+    def __init__(self, interval=0.005, top=20):
+        self.interval = interval
+        self.top = top
+        self.samples = 0
+        self.self_counts = Counter()  # Function at the top of the stack
+        self.total_counts = Counter()  # Function anywhere on the stack
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            self.samples += 1
+            self.self_counts[_describe(frame.f_code)] += 1
+            seen = set()
+            while frame is not None:
+                key = _describe(frame.f_code)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_counts[key] += 1
+                frame = frame.f_back
+
+    def report(self):
+        # The `top` functions by own samples, as fractions of all samples
+        samples = max(self.samples, 1)
+        return [{'function': function, 'self': count / samples, 'total': self.total_counts[function] / samples}
+                for function, count in self.self_counts.most_common(self.top)]
+
+
+def _describe(code):
+    return f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno}({code.co_name})"
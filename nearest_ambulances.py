@@ -0,0 +1,57 @@
+import heapq
+import itertools
+
+
+def k_nearest_ambulances(graph, patient_node, ambulance_nodes, k=None, radius=float('inf'), weight='weight', stats=None):
+    # One reverse Dijkstra from the patient instead of one search per ambulance.
+    # ambulance_nodes maps ambulance id -> node. The search stops as soon as the
+    # k closest ambulances are settled, or once it passes radius. Like
+    # AmbulanceDispatch.find_nearby_ambulances, if nobody is within radius the
+    # single nearest ambulance is returned instead.
+    # Returns {ambulance_id: (node, distance, path to patient)}, nearest first.
+    at_node = {}
+    for ambulance_id, node in ambulance_nodes.items():
+        at_node.setdefault(node, []).append(ambulance_id)
+    if k is None:
+        k = len(ambulance_nodes)
+    # Distances *to* the patient, so search the reversed graph when edges are one-way
+    reverse = graph.reverse(copy=False) if graph.is_directed() else graph
+
+    found = {}
+    distances = {patient_node: 0}
+    predecessors = {}
+    settled = set()
+    counter = itertools.count()
+    heap = [(0, next(counter), patient_node)]
+    limit = radius
+    while heap and len(found) < k:
+        distance, _, node = heapq.heappop(heap)
+        if node in settled:
+            continue
+        if distance > limit:
+            if found or limit == float('inf'):
+                break
+            # Nobody within radius: fall back to the nearest ambulance at any distance
+            limit, k = float('inf'), 1
+        settled.add(node)
+        for ambulance_id in at_node.get(node, ()):
+            if len(found) < k:
+                found[ambulance_id] = (node, distance, _path_to(predecessors, node, patient_node))
+        for neighbor, data in reverse[node].items():
+            new_distance = distance + data[weight]
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                predecessors[neighbor] = node
+                heapq.heappush(heap, (new_distance, next(counter), neighbor))
+
+    if stats is not None:
+        stats['settled'] = stats.get('settled', 0) + len(settled)
+    return found
+
+
+def _path_to(predecessors, node, patient_node):
+    # Predecessors point towards the patient, so following them walks the route forwards
+    path = [node]
+    while path[-1] != patient_node:
+        path.append(predecessors[path[-1]])
+    return path
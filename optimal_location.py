@@ -1,17 +1,20 @@
 # optimal_locations.py
 
-from sklearn.cluster import KMeans
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 
 def find_optimal_locations(n_clusters, emergency_call_locations):
- 
+    # scikit-learn and matplotlib are imported on first use, they dominate import time
+    from sklearn.cluster import KMeans
+
     kmeans = KMeans(n_clusters=n_clusters, random_state=42)
     kmeans.fit(emergency_call_locations)
     # Return the centroids of the clusters
     return kmeans.cluster_centers_, kmeans.labels_
 
 def plot_optimal_locations(emergency_call_locations, optimal_locations, labels):
+    import matplotlib.pyplot as plt
+
     plt.scatter(emergency_call_locations[:, 0], emergency_call_locations[:, 1], c=labels, cmap='viridis', alpha=0.5, label='Emergency Calls')
     plt.scatter(optimal_locations[:, 0], optimal_locations[:, 1], c='red', marker='X', s=100, label='Optimal Ambulance Stations')
     plt.title('Optimal Ambulance Station Locations and Clusters')
@@ -20,7 +23,8 @@ def plot_optimal_locations(emergency_call_locations, optimal_locations, labels):
     plt.legend()
     plt.show()
 
-if __name__ == "__main__":
+def main(argv=None):
+    argparse.ArgumentParser(description="K-means station locations for 200 random emergency calls").parse_args(argv)
     np.random.seed(42)
     # Example usage with randomly generated emergency call locations
     n_emergency_calls = 200
@@ -29,4 +33,8 @@ if __name__ == "__main__":
     optimal_locations,labels = find_optimal_locations(n_ambulance_stations, emergency_call_locations)
     print("Optimal ambulance station locations:")
     print(optimal_locations)
-    plot_optimal_locations(emergency_call_locations, optimal_locations, labels)
\ No newline at end of file
+    plot_optimal_locations(emergency_call_locations, optimal_locations, labels)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import networkx as nx
+
+
+def tree_uses_edge(distances, parents, edges, weight=None):
+    # Whether a shortest-path tree can change after an edge got the given weight
+    # (None: the edge was removed). edges are the orientations (a, b) in which the
+    # tree could use it, a nearer the root. It changes when b hangs off a in the
+    # tree, or when the new weight gives b a shorter route through a.
+    for a, b in edges:
+        if parents.get(b) == a:
+            return True
+        if weight is not None and a in distances and distances[a] + weight < distances.get(b, float('inf')):
+            return True
+    return False
+
+
+class ShortestPathCache:
+    # Bounded LRU of single-source Dijkstra results. Ambulances keep starting
+    # from the same stations and hospitals, so one search per source node
+    # answers every later distance or path query from that node.
+    def __init__(self, graph, maxsize=128, weight='weight'):
+        self.graph = graph
+        self.maxsize = maxsize
+        self.weight = weight
+        self._trees = OrderedDict()  # source -> (distances, predecessors)
+        self.hits = 0
+        self.misses = 0
+
+    def search(self, source):
+        tree = self._trees.get(source)
+        if tree is not None:
+            self.hits += 1
+            self._trees.move_to_end(source)
+            return tree
+
+        self.misses += 1
+        pred, distances = nx.dijkstra_predecessor_and_distance(self.graph, source, weight=self.weight)
+        predecessors = {node: parents[0] for node, parents in pred.items() if parents}
+        tree = (distances, predecessors)
+        self._trees[source] = tree
+        if len(self._trees) > self.maxsize:
+            self._trees.popitem(last=False)  # Evict the least recently used source
+        return tree
+
+    def distance(self, source, target):
+        distances, _ = self.search(source)
+        if target not in distances:
+            raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+        return distances[target]
+
+    def path(self, source, target):
+        distances, predecessors = self.search(source)
+        if target not in distances:
+            raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+        path = [target]
+        while path[-1] != source:
+            path.append(predecessors[path[-1]])
+        path.reverse()
+        return path
+
+    def update_edge(self, u, v, weight=None):
+        # Called after graph[u][v] changed (weight None: removed). Drops only the
+        # trees that used the edge or get shorter through it; returns how many.
+        edges = [(u, v)] if self.graph.is_directed() else [(u, v), (v, u)]
+        stale = [source for source, (distances, predecessors) in self._trees.items()
+                 if tree_uses_edge(distances, predecessors, edges, weight)]
+        for source in stale:
+            del self._trees[source]
+        return len(stale)
+
+    def clear(self):
+        self._trees.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._trees), 'maxsize': self.maxsize}
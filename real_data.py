@@ -1,4 +1,4 @@
-import requests
+import argparse
 from math import radians, sin, cos, sqrt, atan2
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -14,6 +14,8 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return distance
 
 def get_road_network_data_with_hospitals(area_name):
+    import requests  # Only needed when actually downloading
+
     overpass_url = "http://overpass-api.de/api/interpreter"
     overpass_query = f"""
         [out:json];
@@ -115,19 +117,27 @@ def save_to_txt(distances, intersection_ids, filename):
                 distance_to_intersection = node_data["distance_to_intersection"]
                 f.write(f'H{node_id} E{nearest_intersection} {distance_to_intersection}\n')
 
-# Specify the area name (e.g., "Ujjain") for which you want to retrieve data
-area_name = "Ujjain"
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download a road network with hospitals from the Overpass API")
+    # Specify the area name (e.g., "Ujjain") for which you want to retrieve data
+    parser.add_argument('--area', default="Ujjain")
+    parser.add_argument('--out', default='ujjain_map_data.txt')
+    args = parser.parse_args(argv)
+
+    # Retrieve road network data with hospitals for the specified area
+    road_network_data_with_hospitals = get_road_network_data_with_hospitals(args.area)
 
-# Retrieve road network data with hospitals for the specified area
-road_network_data_with_hospitals = get_road_network_data_with_hospitals(area_name)
+    if road_network_data_with_hospitals:
+        # Calculate distances between nodes and extract intersection node IDs
+        distances, intersection_ids = calculate_distances(road_network_data_with_hospitals)
 
-if road_network_data_with_hospitals:
-    # Calculate distances between nodes and extract intersection node IDs
-    distances, intersection_ids = calculate_distances(road_network_data_with_hospitals)
+        # Save data to text file
+        save_to_txt(distances, intersection_ids, args.out)
+
+        print(f"Map data saved to '{args.out}'.")
+    else:
+        print("No road network data with hospitals available for the specified area.")
 
-    # Save data to text file
-    save_to_txt(distances, intersection_ids, 'ujjain_map_data.txt')
 
-    print("Map data saved to 'ujjain_map_data.txt'.")
-else:
-    print("No road network data with hospitals available for the specified area.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import math
+import multiprocessing
+import os
+import random
+from statistics import NormalDist, mean, stdev
+
+from create_graph import recreate_graph_from_file
+from hospital_distances import hospital_distance_table
+from path_cache import ShortestPathCache
+from trace_sink import ColumnarSink, RESULTS
+
+# Dispatch policy name -> module holding its AmbulanceDispatch class
+POLICIES = {
+    'rp': 'simulation_rp',  # With returning protocol
+    'wrp': 'sim_wrp',  # Without returning protocol
+    'path': 'update_avlbl',  # Returning protocol, tracking the path while delivering
+}
+
+
+class Scenario:
+    # Everything one replication needs, apart from the random seed
+    def __init__(self, graph_file, fleet, call_rate, duration, policy='rp',
+                 assignment_file='hospital_assignments.txt', station_mapping_file='hospital_to_station_mapping.txt',
+                 batch_dispatch=False):
+        self.graph_file = graph_file
+        self.fleet = list(fleet)  # Station node of each ambulance
+        self.call_rate = call_rate  # Expected calls per time unit
+        self.duration = duration  # Calls arrive in [0, duration)
+        self.policy = policy
+        self.assignment_file = assignment_file
+        self.station_mapping_file = station_mapping_file
+        self.batch_dispatch = batch_dispatch  # Drain the queue with one optimal matching (batch_dispatch.py)
+
+
+# Loaded once in the parent before the pool starts. With the 'fork' start method
+# the workers see it copy-on-write, so the graph and distance tables are never
+# rebuilt or pickled per replication.
+_shared = {}
+
+
+def load_shared(scenario):
+    import importlib
+    module = importlib.import_module(POLICIES[scenario.policy])
+    graph = recreate_graph_from_file(scenario.graph_file)
+    hospital_distance_table(graph)  # Cached on the graph, so the workers inherit it
+    path_cache = ShortestPathCache(graph)
+    for station in scenario.fleet:
+        path_cache.search(station)  # Warm the cache with the trees every run starts from
+    _shared.update(
+        scenario=scenario,
+        dispatcher_class=module.AmbulanceDispatch,
+        graph=graph,
+        path_cache=path_cache,
+        hospital_assignments=module.read_hospital_assignments(scenario.assignment_file),
+        hospital_to_station=module.read_ambulance_station_assignments(scenario.station_mapping_file),
+    )
+
+
+def generate_calls(seed):
+    # Homogeneous Poisson arrivals over the emergency nodes that have a hospital
+    scenario = _shared['scenario']
+    rng = random.Random(seed)
+    nodes = sorted(_shared['hospital_assignments'])
+    patient_calls = {}
+    time = rng.expovariate(scenario.call_rate)
+    while time < scenario.duration:
+        patient_id = len(patient_calls) + 1
+        patient_calls[patient_id] = (rng.choice(nodes), 1, time)
+        time += rng.expovariate(scenario.call_rate)
+    return patient_calls
+
+
+def run_replication(seed):
+    scenario = _shared['scenario']
+    ambulance_data = {i: (station, None, station, None, None) for i, station in enumerate(scenario.fleet, start=1)}
+    sink = ColumnarSink(None, level=RESULTS)
+    dispatcher = _shared['dispatcher_class'](
+        _shared['graph'], ambulance_data, path_cache=_shared['path_cache'], trace=sink,
+        hospital_assignments=_shared['hospital_assignments'], hospital_to_station=_shared['hospital_to_station'],
+        batch_dispatch=scenario.batch_dispatch)
+    patient_calls = generate_calls(seed)
+    dispatcher.run_simulation(patient_calls, event_driven=True)
+    records = sink.records()
+    response = records['arrival_time'] - records['call_time']
+    waiting = records['assignment_time'] - records['call_time']
+    # Calls still queued when the run stops never got an ambulance. They are
+    # censored: their response time is at least the time from the call to the
+    # end of the run, which censored_mean_response uses instead of leaving them out.
+    end = dispatcher.current_time
+    censored = [end - entry[1][2] for entry in dispatcher.priority_queue]
+    served_and_censored = response.tolist() + censored
+    return {
+        'seed': seed,
+        'calls': len(patient_calls),
+        'served': len(records),
+        'unserved': len(censored),
+        'mean_response': float(response.mean()) if len(records) else math.nan,
+        'censored_mean_response': mean(served_and_censored) if served_and_censored else math.nan,
+        'mean_waiting': float(waiting.mean()) if len(records) else math.nan,
+        'max_response': float(response.max()) if len(records) else math.nan,
+    }
+
+
+def confidence_interval(values, confidence=0.95):
+    values = [v for v in values if not math.isnan(v)]
+    if len(values) < 2:
+        m = values[0] if values else math.nan
+        return {'mean': m, 'std': math.nan, 'low': math.nan, 'high': math.nan}
+    m, s = mean(values), stdev(values)
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * s / math.sqrt(len(values))
+    return {'mean': m, 'std': s, 'low': m - half_width, 'high': m + half_width}
+
+
+def run_replications(scenario, n_replications, base_seed=0, workers=None, confidence=0.95):
+    load_shared(scenario)
+    seeds = [base_seed + i for i in range(n_replications)]
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        runs = [run_replication(seed) for seed in seeds]
+    elif 'fork' in multiprocessing.get_all_start_methods():
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            runs = pool.map(run_replication, seeds, chunksize=max(1, n_replications // (4 * workers)))
+    else:
+        # No fork (e.g. Windows): every worker loads its own copy once
+        with multiprocessing.Pool(workers, initializer=load_shared, initargs=(scenario,)) as pool:
+            runs = pool.map(run_replication, seeds)
+    return {
+        'policy': scenario.policy,
+        'replications': n_replications,
+        'confidence': confidence,
+        'mean_response': confidence_interval([r['mean_response'] for r in runs], confidence),
+        'censored_mean_response': confidence_interval([r['censored_mean_response'] for r in runs], confidence),
+        'unserved': sum(r['unserved'] for r in runs),
+        'calls': sum(r['calls'] for r in runs),
+        'mean_waiting': confidence_interval([r['mean_waiting'] for r in runs], confidence),
+        'max_response': confidence_interval([r['max_response'] for r in runs], confidence),
+        'runs': runs,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare dispatch policies over seeded replications")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--fleet', nargs='+', default=['A210', 'A211', 'A212', 'A213', 'A214'])
+    parser.add_argument('--rate', type=float, default=1 / 150, help="calls per time unit")
+    parser.add_argument('--duration', type=float, default=4650)
+    parser.add_argument('--policies', nargs='+', default=['rp', 'wrp'], choices=sorted(POLICIES))
+    parser.add_argument('--replications', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch', action='store_true', help="drain the queue with one optimal assignment per batch")
+    args = parser.parse_args(argv)
+
+    for policy in args.policies:
+        scenario = Scenario(args.graph, args.fleet, args.rate, args.duration, policy=policy, batch_dispatch=args.batch)
+        summary = run_replications(scenario, args.replications, base_seed=args.seed, workers=args.workers)
+        ci = summary['mean_response']
+        print(f"{policy}: mean response {ci['mean']:.2f} ({summary['confidence']:.0%} CI {ci['low']:.2f} - {ci['high']:.2f}) over {args.replications} replications")
+        if summary['unserved']:
+            censored = summary['censored_mean_response']
+            print(f"  {summary['unserved']} of {summary['calls']} calls unserved at the end of the run; counted as censored "
+                  f"at the end, mean response is at least {censored['mean']:.2f} (CI {censored['low']:.2f} - {censored['high']:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import heapq
+import itertools
+import time
+
+import networkx as nx
+
+from call_schedule import CallSchedule
+from event_simulation import run_event_simulation
+from incremental_assignment import FacilityAssignments
+from trace_sink import EVENTS
+
+
+class RoadUpdates:
+    # Changes travel times, closes and reopens roads of a dispatcher's graph
+    # while it runs. Everything derived from the graph follows the change, but
+    # only where the changed edge matters:
+    #   - the dispatcher's path cache and the hospital distance table drop or
+    #     recompute just the trees that used the edge or get shorter through it,
+    #   - the hospital and station Voronoi partitions (FacilityAssignments)
+    #     repair the affected cells, and the rows of hospital_assignments and
+    #     hospital_to_station that changed are replaced,
+    #   - ambulances driving over the edge are rerouted from where they are
+    #     with a local detour that rejoins their route: those driving back to
+    #     their station, and those delivering a patient when the dispatcher
+    #     keeps their route (update_avlbl), which then free up later or sooner.
+    # Whole-graph snapshots (CSR copy, persistent distance cache, contraction
+    # hierarchy) no longer describe the graph and are dropped from graph.graph.
+    # simulation_rp and sim_wrp do not keep a delivery route, so their busy
+    # ambulances keep the delivery time they were dispatched with; only the
+    # path they drive back on afterwards is refreshed. An ambulance with no way
+    # around a closed road keeps its route and timing and is reported in
+    # 'stranded' instead.
+    # The dispatcher's hospital_assignments and hospital_to_station are copied
+    # before they are changed, since replications share them between runs.
+    def __init__(self, dispatcher, assignments=None, weight='weight'):
+        self.dispatcher = dispatcher
+        self.graph = dispatcher.graph
+        self.weight = weight
+        if assignments is None:
+            assignments = FacilityAssignments(self.graph, weight=weight)
+        self.assignments = assignments
+        dispatcher.hospital_assignments = dict(dispatcher.hospital_assignments)
+        dispatcher.hospital_to_station = dict(dispatcher.hospital_to_station)
+        self._scheduled = []  # Heap of (time, counter, u, v, weight) changes for the event-driven run
+        self._counter = itertools.count()
+        self.history = []  # One report per applied change
+
+    def set_travel_time(self, u, v, weight):
+        # Congestion, or a closed road reopened (the edge is added if missing)
+        self.graph.add_edge(u, v, **{self.weight: weight})
+        return self._changed(u, v, weight)
+
+    def close_road(self, u, v):
+        self.graph.remove_edge(u, v)
+        return self._changed(u, v, None)
+
+    def schedule(self, at, u, v, weight=None):
+        # Change applied by run_simulation when the clock reaches `at` (weight None: close the road)
+        heapq.heappush(self._scheduled, (at, next(self._counter), u, v, weight))
+
+    def next_time(self):
+        return self._scheduled[0][0] if self._scheduled else None
+
+    def apply_due(self, now):
+        reports = []
+        while self._scheduled and self._scheduled[0][0] <= now:
+            _, _, u, v, weight = heapq.heappop(self._scheduled)
+            reports.append(self.close_road(u, v) if weight is None else self.set_travel_time(u, v, weight))
+        return reports
+
+    def run_simulation(self, patient_calls):
+        # Event-driven run of the dispatcher with the scheduled road changes applied on time
+        call_schedule = patient_calls if isinstance(patient_calls, CallSchedule) else CallSchedule(patient_calls)
+        run_event_simulation(self.dispatcher, call_schedule, road_updates=self)
+        self.dispatcher.trace.flush()
+
+    def _edges(self, u, v):
+        # The orientations a route can drive the changed road in
+        return {(u, v)} if self.graph.is_directed() else {(u, v), (v, u)}
+
+    def _changed(self, u, v, weight):
+        dispatcher = self.dispatcher
+        for key in ('csr_graph', 'distance_cache', 'contraction_hierarchy'):
+            self.graph.graph.pop(key, None)
+        report = {'time': dispatcher.current_time, 'edge': (u, v), 'weight': weight}
+        report['paths'] = dispatcher.path_cache.update_edge(u, v, weight)
+        report['hospitals'] = dispatcher.hospital_table.update_edge(u, v, weight)
+
+        edges = self._edges(u, v)
+        changes = self.assignments.update_edge(u, v, weight)
+        # A patient cut off from every hospital keeps the old one, whose
+        # distance lookup then reports no path like any unreachable patient
+        for patient, hospital in changes['hospital_assignments'].items():
+            if hospital is not None:
+                dispatcher.hospital_assignments[patient] = hospital
+        # Rows read from a file may take a different one of several equally short
+        # paths than the partition, so rows over the edge are refreshed as well
+        rows = changes['station_mapping']
+        for hospital, data in dispatcher.hospital_to_station.items():
+            if hospital not in rows and _uses(data['travel_path'], edges):
+                rows[hospital] = (self.assignments.station_row(hospital)
+                                 if hospital in self.assignments.stations.owner else None)
+        for hospital, row in rows.items():
+            if hospital not in dispatcher.hospital_to_station:
+                continue
+            # With no station reachable the ambulance stays at the hospital
+            station, travel_time, travel_path = (hospital, 0, [hospital]) if row is None else row
+            dispatcher.hospital_to_station[hospital] = {'station': station, 'travel_time': travel_time,
+                                                        'travel_path': travel_path}
+        report['assignments'] = len(changes['hospital_assignments'])
+        report['stations'] = len(rows)
+
+        # Busy ambulances drive back on the new path once they are free
+        for info in dispatcher.unavailable_ambulances.values():
+            if info['hospital_location'] in rows or _uses(info['path_to_station'], edges):
+                data = dispatcher.hospital_to_station[info['hospital_location']]
+                info['station_location'], info['path_to_station'] = data['station'], data['travel_path']
+
+        report['rerouted'] = []
+        report['stranded'] = []  # Cut off from where they are going: they keep their route and timing
+        report['settled'] = 0
+        # Ambulances on their way to a patient and hospital (update_avlbl keeps
+        # the route) free up when the repaired route ends
+        for ambulance_id, info in dispatcher.unavailable_ambulances.items():
+            route = info.get('route')
+            if route is None:
+                continue
+            try:
+                repaired = self._reroute(route, edges, report, stops=[info['patient_location']])
+            except nx.NetworkXNoPath:
+                report['stranded'].append(ambulance_id)
+                continue
+            if repaired is not None:
+                info['route'], info['final_path'] = repaired, repaired.path
+                info['availability_time'] += repaired.end_time - route.end_time
+                dispatcher.fleet.reschedule(ambulance_id, info['availability_time'])
+                report['rerouted'].append(ambulance_id)
+        return_routes = getattr(dispatcher, 'return_routes', {})
+        for ambulance_id, route in list(return_routes.items()):
+            try:
+                repaired = self._reroute(route, edges, report)
+            except nx.NetworkXNoPath:
+                report['stranded'].append(ambulance_id)
+                continue
+            if repaired is not None:
+                return_routes[ambulance_id] = repaired
+                report['rerouted'].append(ambulance_id)
+        self.history.append(report)
+        if dispatcher.trace.level >= EVENTS:
+            change = "closed" if weight is None else f"travel time {weight}"
+            dispatcher.trace.event(f"{dispatcher.current_time}: Road {u}-{v} {change}, ambulances {report['rerouted']} rerouted"
+                                   + (f", {report['stranded']} cut off" if report['stranded'] else ""))
+        return report
+
+    def _reroute(self, route, edges, report, stops=()):
+        # The route from the next node on, if it drives over the changed road. The
+        # edge being driven now is finished as planned; every leg between the
+        # stops still ahead (a patient to pick up) is repaired on its own, so no
+        # stop is skipped. None when the route is unaffected. Raises
+        # NetworkXNoPath when a leg has no way around the road: a shortened
+        # route would deliver the patient early at a hospital it never reaches.
+        path = route.path
+        start = min(route.index_at(self.dispatcher.current_time) + 1, len(path) - 1)
+        if not _uses(path[start:], edges):
+            return None
+        cuts = [start] + [path.index(stop, start + 1) for stop in stops if stop in path[start + 1:-1]] + [len(path) - 1]
+        tail = [path[start]]
+        for a, b in zip(cuts, cuts[1:]):
+            tail += self._repair_leg(path[a:b + 1], edges, report)[1:]
+        if not all(self.graph.has_edge(a, b) for a, b in zip(tail, tail[1:])):
+            # Still over a road closed earlier, from a route that was already cut off
+            raise nx.NetworkXNoPath("Route runs over a closed road")
+        return route.reroute(self.graph, start, tail, self.weight)
+
+    def _repair_leg(self, leg, edges, report):
+        # The cheapest detour from the start of the leg to a node past its last
+        # use of the road, then the rest of the leg as planned
+        used = [k for k in range(len(leg) - 1) if (leg[k], leg[k + 1]) in edges]
+        if not used:
+            return leg
+        # Cost of finishing the leg from each node after the last use
+        exits = {leg[-1]: 0}
+        for k in range(len(leg) - 2, used[-1], -1):
+            if not self.graph.has_edge(leg[k], leg[k + 1]):
+                break  # A road closed earlier; only the nodes after it finish the leg
+            exits[leg[k]] = exits[leg[k + 1]] + self.graph[leg[k]][leg[k + 1]][self.weight]
+        rejoin, detour = _rejoin(self.graph, leg[0], exits, self.weight, report)
+        return detour + leg[leg.index(rejoin, used[-1] + 1) + 1:]
+
+
+def _uses(path, edges):
+    return any((a, b) in edges for a, b in zip(path, path[1:]))
+
+
+def _rejoin(graph, source, exits, weight, report):
+    # (exit node, path source -> exit node) minimising its length plus exits[node].
+    # A Dijkstra from source that stops once no unsettled node can beat the best
+    # exit, so a closed road costs a search around it, not one to the destination.
+    distances = {source: 0}
+    predecessors = {}
+    settled = set()
+    best, best_node = float('inf'), None
+    counter = itertools.count()
+    heap = [(0, next(counter), source)]
+    while heap:
+        distance, _, node = heapq.heappop(heap)
+        if distance >= best:
+            break
+        if node in settled:
+            continue
+        settled.add(node)
+        if node in exits and distance + exits[node] < best:
+            best, best_node = distance + exits[node], node
+        for neighbor, data in graph[node].items():
+            new_distance = distance + data[weight]
+            if new_distance < distances.get(neighbor, float('inf')):
+                distances[neighbor] = new_distance
+                predecessors[neighbor] = node
+                heapq.heappush(heap, (new_distance, next(counter), neighbor))
+    report['settled'] += len(settled)
+    if best_node is None:
+        raise nx.NetworkXNoPath(f"No way from {source} back onto its route")
+    path = [best_node]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    path.reverse()
+    return best_node, path
+
+
+def main(argv=None):
+    import importlib
+
+    from create_graph import recreate_graph_from_file
+    from replications import POLICIES
+    from trace_sink import TextSink, RESULTS
+
+    parser = argparse.ArgumentParser(description="Run a dispatch simulation while roads are closed or change travel time")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='rp')
+    parser.add_argument('--fleet', nargs='+', default=['A210', 'A211', 'A212', 'A213', 'A214'], help="station of each ambulance")
+    parser.add_argument('--calls', nargs='+', default=['E28', 'E8', 'E31', 'E37', 'E4', 'E7', 'E6', 'E107'],
+                        help="emergency nodes, one call every --interval time units")
+    parser.add_argument('--interval', type=float, default=40)
+    parser.add_argument('--close', nargs=3, action='append', default=[], metavar=('TIME', 'U', 'V'))
+    parser.add_argument('--set', nargs=4, action='append', default=[], metavar=('TIME', 'U', 'V', 'WEIGHT'),
+                        help="change the travel time of a road (adds it when missing)")
+    parser.add_argument('--out', default='results_roads.txt')
+    args = parser.parse_args(argv)
+
+    open(args.out, 'w').close()  # TextSink appends
+    G = recreate_graph_from_file(args.graph)
+    module = importlib.import_module(POLICIES[args.policy])
+    ambulance_data = {i + 1: (station, None, station, None, None) for i, station in enumerate(args.fleet)}
+    dispatcher = module.AmbulanceDispatch(G, ambulance_data, trace=TextSink(args.out, stream=None, level=RESULTS))
+    roads = RoadUpdates(dispatcher)
+    for at, u, v in args.close:
+        roads.schedule(float(at), u, v)
+    for at, u, v, weight in args.set:
+        roads.schedule(float(at), u, v, float(weight))
+    calls = {i + 1: (node, 1, i * args.interval) for i, node in enumerate(args.calls)}
+
+    start = time.perf_counter()
+    roads.run_simulation(calls)
+    elapsed = time.perf_counter() - start
+    for report in roads.history:
+        u, v = report['edge']
+        change = "closed" if report['weight'] is None else f"travel time {report['weight']}"
+        print(f"{report['time']}: {u}-{v} {change}: {report['paths']} path trees dropped, "
+              f"{len(report['hospitals'])} hospital trees recomputed, {report['assignments']} assignment and "
+              f"{report['stations']} station rows changed, ambulances {report['rerouted']} rerouted "
+              f"({report['settled']} nodes searched)" + (f", {report['stranded']} cut off" if report['stranded'] else ""))
+    print(f"Simulated in {elapsed:.3f} s, results in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
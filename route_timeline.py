@@ -0,0 +1,62 @@
+from bisect import bisect_right
+
+
+class RouteTimeline:
+    # A path together with the time the ambulance reaches each of its nodes.
+    # Where the ambulance is at any time is a bisect on the cumulative travel
+    # times, so nothing has to be stepped edge by edge, several short edges can
+    # be crossed between two updates, and positions part-way along an edge are
+    # available as well.
+    def __init__(self, graph, path, start_time, weight='weight'):
+        self.path = list(path)
+        self.start_time = start_time
+        arrival_times = [start_time]
+        for u, v in zip(self.path, self.path[1:]):
+            arrival_times.append(arrival_times[-1] + graph[u][v][weight])
+        self.arrival_times = arrival_times
+        self.end_time = arrival_times[-1]
+
+    def reroute(self, graph, index, tail, weight='weight'):
+        # Same route and timing up to path[index], then tail (which starts at
+        # path[index]) timed on the current graph
+        route = RouteTimeline(graph, tail, self.arrival_times[index], weight)
+        route.path = self.path[:index] + route.path
+        route.arrival_times = self.arrival_times[:index] + route.arrival_times
+        route.start_time = self.start_time
+        return route
+
+    def index_at(self, time):
+        # Index in path of the last node reached by time
+        return max(bisect_right(self.arrival_times, time) - 1, 0)
+
+    def node_at(self, time):
+        return self.path[self.index_at(time)]
+
+    def position_at(self, time):
+        # (last node reached, next node or None, fraction of that edge covered)
+        i = self.index_at(time)
+        if i == len(self.path) - 1:
+            return self.path[i], None, 0.0
+        entered, leaves = self.arrival_times[i], self.arrival_times[i + 1]
+        fraction = (time - entered) / (leaves - entered) if leaves > entered else 0.0
+        return self.path[i], self.path[i + 1], min(max(fraction, 0.0), 1.0)
+
+    def edge_entered_at(self, time):
+        return self.arrival_times[self.index_at(time)]
+
+    def coordinates_at(self, graph, time):
+        # Interpolated 'pos' along the current edge
+        u, v, fraction = self.position_at(time)
+        x0, y0 = graph.nodes[u]['pos']
+        if v is None:
+            return x0, y0
+        x1, y1 = graph.nodes[v]['pos']
+        return x0 + (x1 - x0) * fraction, y0 + (y1 - y0) * fraction
+
+    def next_arrival(self, time):
+        # Time the next node is reached after time, None once the route is finished
+        i = bisect_right(self.arrival_times, time)
+        return self.arrival_times[i] if i < len(self.arrival_times) else None
+
+    def finished(self, time):
+        return time >= self.end_time
@@ -0,0 +1,257 @@
+import argparse
+import heapq
+import itertools
+import time
+from math import radians, sin, cos, sqrt, atan2
+
+import networkx as nx
+
+ENGINES = ('dijkstra', 'astar', 'bidirectional', 'ch', 'csgraph')
+
+
+def euclidean(p, q):
+    return sqrt((p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2)
+
+
+def haversine(p, q):
+    # Great-circle distance in km between two (lat, lon) positions
+    lat1, lon1, lat2, lon2 = map(radians, [p[0], p[1], q[0], q[1]])
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+METRICS = {'euclidean': euclidean, 'haversine': haversine}
+
+
+def heuristic_scale(graph, metric, weight='weight'):
+    # Largest factor s such that s * metric(u, v) <= weight(u, v) on every edge.
+    # Edge weights are rounded (graph_structure.txt) or not true distances at all,
+    # so the raw metric can overestimate; scaled by s it is admissible and, since
+    # the metric obeys the triangle inequality, also consistent.
+    pos = nx.get_node_attributes(graph, 'pos')
+    scale = float('inf')
+    for u, v, data in graph.edges(data=True):
+        straight = metric(pos[u], pos[v])
+        if straight > 0:
+            scale = min(scale, data[weight] / straight)
+    return 0.0 if scale == float('inf') else scale
+
+
+class Router:
+    # Point-to-point shortest paths with a selectable engine. It has the same
+    # distance()/path() interface as ShortestPathCache, so it can be handed to
+    # AmbulanceDispatch as its path_cache. `settled` counts the nodes removed
+    # from the heap over all queries, which is what the benchmark compares.
+    # The 'ch' engine answers from a contraction hierarchy: pass one (or the
+    # path of a saved one), otherwise it is built once and kept on the graph.
+    # 'csgraph' runs whole single-source searches in scipy.sparse.csgraph on the
+    # CSR copy of the graph and keeps the recent ones (csr_graph.CSRPathCache).
+    def __init__(self, graph, engine='dijkstra', metric='euclidean', weight='weight', hierarchy=None):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown routing engine {engine!r}, expected one of {ENGINES}")
+        self.graph = graph
+        self.engine = engine
+        self.weight = weight
+        self.settled = 0
+        self.queries = 0
+        if engine == 'astar':
+            self.metric = METRICS[metric]
+            self.pos = nx.get_node_attributes(graph, 'pos')
+            self.scale = heuristic_scale(graph, self.metric, weight)
+        if engine == 'ch':
+            from contraction_hierarchy import ContractionHierarchy, build_hierarchy
+            if isinstance(hierarchy, str):
+                hierarchy = ContractionHierarchy.load(hierarchy)
+            if hierarchy is None:
+                hierarchy = graph.graph.get('contraction_hierarchy')
+            if hierarchy is None:
+                hierarchy = build_hierarchy(graph, weight=weight)
+                graph.graph['contraction_hierarchy'] = hierarchy
+            self.hierarchy = hierarchy
+        if engine == 'csgraph':
+            from csr_graph import CSRPathCache, csr_graph
+            cache = graph.graph.get('distance_cache')
+            # With a persistent distance cache, its station and hospital trees are served without searching
+            self.trees = CSRPathCache(csr_graph(graph)) if cache is None else cache.path_cache()
+
+    def shortest_path(self, source, target):
+        # (length, path); raises nx.NetworkXNoPath like the networkx functions
+        self.queries += 1
+        if source == target:
+            return 0, [source]
+        if self.engine == 'bidirectional':
+            return self._bidirectional(source, target)
+        if self.engine == 'ch':
+            before = self.hierarchy.settled
+            try:
+                return self.hierarchy.shortest_path(source, target)
+            finally:
+                self.settled += self.hierarchy.settled - before
+        if self.engine == 'csgraph':
+            return self.trees.shortest_path(source, target)
+        return self._astar(source, target)
+
+    def distance(self, source, target):
+        if self.engine == 'ch' and source != target:
+            # Skip unpacking the shortcuts when only the length is needed
+            self.queries += 1
+            before = self.hierarchy.settled
+            try:
+                return self.hierarchy.distance(source, target)
+            finally:
+                self.settled += self.hierarchy.settled - before
+        if self.engine == 'csgraph':
+            self.queries += 1
+            return self.trees.distance(source, target)
+        return self.shortest_path(source, target)[0]
+
+    def path(self, source, target):
+        return self.shortest_path(source, target)[1]
+
+    def update_edge(self, u, v, weight=None):
+        # Called after graph[u][v] changed (weight None: removed). Dijkstra and the
+        # bidirectional search read the live graph. A* only has to keep its
+        # heuristic admissible, and csgraph drops the trees that depend on the edge.
+        # A contraction hierarchy has no local update and is rebuilt. Returns the
+        # number of cached trees dropped, like ShortestPathCache.update_edge.
+        if self.engine == 'astar' and weight is not None:
+            straight = self.metric(self.pos[u], self.pos[v])
+            if straight > 0:
+                self.scale = min(self.scale, weight / straight)
+        if self.engine == 'ch':
+            from contraction_hierarchy import build_hierarchy
+            # Routers sharing the graph rebuild it once between them
+            hierarchy = self.graph.graph.get('contraction_hierarchy')
+            if hierarchy is None or hierarchy is self.hierarchy:
+                hierarchy = build_hierarchy(self.graph, weight=self.weight)
+                self.graph.graph['contraction_hierarchy'] = hierarchy
+            self.hierarchy = hierarchy
+        if self.engine == 'csgraph':
+            from csr_graph import CSRGraph
+            csr = self.graph.graph.get('csr_graph')
+            if csr is None or csr is self.trees.csr:
+                csr = CSRGraph.from_networkx(self.graph, self.weight)
+                self.graph.graph['csr_graph'] = csr
+            return self.trees.update_edge(csr, u, v, weight)
+        return 0
+
+    def _astar(self, source, target):
+        # Plain Dijkstra is A* with a zero heuristic
+        if self.engine == 'astar':
+            goal, scale, metric, pos = self.pos[target], self.scale, self.metric, self.pos
+            heuristic = lambda node: scale * metric(pos[node], goal)
+        else:
+            heuristic = lambda node: 0
+        distances = {source: 0}
+        predecessors = {}
+        settled = set()
+        counter = itertools.count()
+        heap = [(heuristic(source), next(counter), source)]
+        while heap:
+            _, _, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node == target:
+                self.settled += len(settled)
+                return distances[target], _unwind(predecessors, source, target)
+            for neighbor, data in self.graph[node].items():
+                new_distance = distances[node] + data[self.weight]
+                if new_distance < distances.get(neighbor, float('inf')):
+                    distances[neighbor] = new_distance
+                    predecessors[neighbor] = node
+                    heapq.heappush(heap, (new_distance + heuristic(neighbor), next(counter), neighbor))
+        self.settled += len(settled)
+        raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+
+    def _bidirectional(self, source, target):
+        forward_graph = self.graph
+        backward_graph = self.graph.reverse(copy=False) if self.graph.is_directed() else self.graph
+        distances = ({source: 0}, {target: 0})
+        predecessors = ({}, {})
+        settled = (set(), set())
+        counter = itertools.count()
+        heaps = ([(0, next(counter), source)], [(0, next(counter), target)])
+        best, meeting = float('inf'), None
+        while heaps[0] and heaps[1]:
+            # Stop once no path through an unsettled node can beat the best meeting point
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            distance, _, node = heapq.heappop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            graph = forward_graph if side == 0 else backward_graph
+            for neighbor, data in graph[node].items():
+                new_distance = distance + data[self.weight]
+                if new_distance < distances[side].get(neighbor, float('inf')):
+                    distances[side][neighbor] = new_distance
+                    predecessors[side][neighbor] = node
+                    heapq.heappush(heaps[side], (new_distance, next(counter), neighbor))
+                if neighbor in distances[1 - side]:
+                    total = distances[side][neighbor] + distances[1 - side][neighbor]
+                    if total < best:
+                        best, meeting = total, neighbor
+        self.settled += len(settled[0]) + len(settled[1])
+        if meeting is None:
+            raise nx.NetworkXNoPath(f"No path from {source} to {target}")
+        path = _unwind(predecessors[0], source, meeting)
+        path += list(reversed(_unwind(predecessors[1], target, meeting)))[1:]
+        return best, path
+
+
+def _unwind(predecessors, source, target):
+    path = [target]
+    while path[-1] != source:
+        path.append(predecessors[path[-1]])
+    path.reverse()
+    return path
+
+
+def benchmark(graph, pairs, engines=ENGINES):
+    # Settled nodes and wall time per engine for the same (source, target) pairs
+    report = {}
+    for engine in engines:
+        router = Router(graph, engine=engine)
+        start = time.perf_counter()
+        total_length = 0
+        for source, target in pairs:
+            try:
+                total_length += router.distance(source, target)
+            except nx.NetworkXNoPath:
+                pass
+        report[engine] = {
+            'queries': router.queries,
+            'settled': router.settled,
+            'settled_per_query': router.settled / max(router.queries, 1),
+            'seconds': time.perf_counter() - start,
+            'total_length': total_length,
+        }
+    return report
+
+
+def main(argv=None):
+    from create_graph import recreate_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Compare routing engines on dispatch queries")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--assignments', default='hospital_assignments.txt',
+                        help="patient -> hospital assignments; every pair is routed, plus station -> patient")
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    with open(args.assignments) as f:
+        next(f)  # Skip the header line
+        assignments = dict(line.strip().split(' assigned to ') for line in f if line.strip())
+    stations = [node for node in G.nodes if node.startswith('A')]
+    pairs = [(patient, hospital) for patient, hospital in assignments.items() if patient in G and hospital in G]
+    pairs += [(station, patient) for station in stations for patient, _ in pairs[:50]]
+
+    print(f"{len(pairs)} queries on {G.number_of_nodes()} nodes")
+    for engine, row in benchmark(G, pairs).items():
+        print(f"{engine:>13}: {row['settled_per_query']:8.1f} settled/query  {row['seconds'] * 1000:8.1f} ms  total length {row['total_length']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+# One row per call; the patient id is the row number + 1 and node indexes the
+# 'nodes' list of the JSON header, which keeps a call at 13 bytes on disk
+CALL_DTYPE = np.dtype([('time', '<f8'), ('node', '<i4'), ('patient_type', 'i1')])
+
+
+def node_weights(graph, type_weights=None, hotspots=(), weights=None):
+    # Demand weight of every node that can raise a call, as (node ids, probabilities).
+    # type_weights maps node_type -> weight (default: only emergency 'E' nodes).
+    # hotspots are (x, y, sigma, strength) Gaussian bumps over the 'pos' coordinates,
+    # multiplying the weight by 1 + strength * exp(-d^2 / 2 sigma^2) for each one.
+    # weights, if given, is an explicit {node: weight} density map and overrides both.
+    if weights is not None:
+        nodes = [node for node in graph.nodes if weights.get(node, 0) > 0]
+        w = np.array([weights[node] for node in nodes], dtype=float)
+    else:
+        type_weights = type_weights or {'E': 1.0}
+        nodes = [node for node, data in graph.nodes(data=True) if type_weights.get(data['node_type'], 0) > 0]
+        w = np.array([type_weights[graph.nodes[node]['node_type']] for node in nodes], dtype=float)
+        if hotspots and nodes:
+            pos = np.array([graph.nodes[node]['pos'] for node in nodes], dtype=float)
+            factor = np.ones(len(nodes))
+            for x, y, sigma, strength in hotspots:
+                d2 = (pos[:, 0] - x) ** 2 + (pos[:, 1] - y) ** 2
+                factor += strength * np.exp(-d2 / (2 * sigma ** 2))
+            w *= factor
+    if not nodes:
+        raise ValueError("No node has a positive demand weight")
+    return nodes, w / w.sum()
+
+
+def read_weights_file(file_path):
+    # 'node weight' per line, e.g. population or historical call counts
+    weights = {}
+    with open(file_path) as f:
+        for line in f:
+            if line.strip() and not line.startswith('#'):
+                node, weight = line.split()
+                weights[node] = float(weight)
+    return weights
+
+
+def arrival_times(rng, rate, duration=None, n_calls=None, profile=None, period_length=60.0, chunk_size=1 << 16):
+    # Yields sorted arrival times in chunks. Without a profile the arrivals are a
+    # homogeneous Poisson process with the given rate (calls per time unit). A
+    # profile is a list of rate multipliers, one per period_length, repeated
+    # cyclically (24 hourly values give a daily pattern); the non-homogeneous
+    # process is sampled by thinning candidates drawn at the peak rate.
+    # Stops after duration time units or n_calls calls, whichever comes first.
+    if duration is None and n_calls is None:
+        raise ValueError("Give a duration or a number of calls")
+    duration = math.inf if duration is None else duration
+    n_calls = math.inf if n_calls is None else n_calls
+    if profile is not None:
+        profile = np.asarray(profile, dtype=float)
+        peak = rate * profile.max()
+    else:
+        peak = rate
+    t = 0.0
+    produced = 0
+    while produced < n_calls:
+        candidates = t + np.cumsum(rng.exponential(1 / peak, chunk_size))
+        t = candidates[-1]
+        if profile is not None:
+            period = (candidates // period_length).astype(np.int64) % len(profile)
+            candidates = candidates[rng.random(chunk_size) * profile.max() < profile[period]]
+        candidates = candidates[candidates < duration]
+        if n_calls - produced < len(candidates):
+            candidates = candidates[:int(n_calls - produced)]
+        if len(candidates):
+            produced += len(candidates)
+            yield candidates
+        if t >= duration:
+            break
+
+
+def generate_calls(graph, rate, duration=None, n_calls=None, seed=0, profile=None, period_length=60.0,
+                   type_weights=None, hotspots=(), weights=None, patient_types=None, chunk_size=1 << 16):
+    # (node ids, iterator of CALL_DTYPE chunks). Nothing is held beyond one chunk,
+    # so 10^7 calls cost the same memory as 10^4.
+    # patient_types maps patient type -> probability (default: every call is type 1)
+    rng = np.random.default_rng(seed)
+    nodes, p = node_weights(graph, type_weights, hotspots, weights)
+    cumulative = np.cumsum(p)
+    if patient_types:
+        types = np.array(list(patient_types), dtype=np.int8)
+        type_p = np.array(list(patient_types.values()), dtype=float)
+        type_p /= type_p.sum()
+
+    def chunks():
+        for times in arrival_times(rng, rate, duration, n_calls, profile, period_length, chunk_size):
+            batch = np.empty(len(times), dtype=CALL_DTYPE)
+            batch['time'] = times
+            # Inverse-CDF sampling, faster than rng.choice(p=...) for large node sets
+            batch['node'] = np.minimum(np.searchsorted(cumulative, rng.random(len(times)), side='right'), len(nodes) - 1)
+            batch['patient_type'] = rng.choice(types, len(times), p=type_p) if patient_types else 1
+            yield batch
+    return nodes, chunks()
+
+
+def fleet_config(graph, size, stations=None):
+    # Station node of each of `size` ambulances, spread round-robin over the stations.
+    # Defaults to the graph's ambulance stations ('A' nodes), or its hospitals when it has none.
+    if not stations:
+        stations = sorted(node for node, data in graph.nodes(data=True) if data['node_type'] == 'A')
+    if not stations:
+        stations = sorted(node for node, data in graph.nodes(data=True) if data['node_type'] == 'H')
+    return [stations[i % len(stations)] for i in range(size)]
+
+
+def ambulance_data(fleet):
+    # The ambulance_data dict AmbulanceDispatch expects, every ambulance idle at its station
+    return {i: (station, None, station, None, None) for i, station in enumerate(fleet, start=1)}
+
+
+def write_scenario(prefix, nodes, chunks, fleet, **meta):
+    # <prefix>.calls.bin: the raw CALL_DTYPE rows, appended chunk by chunk.
+    # <prefix>.json: node table, fleet and whatever describes the run (rate, seed, ...).
+    n_calls, last_time = 0, 0.0
+    with open(f"{prefix}.calls.bin", "wb") as f:
+        for batch in chunks:
+            batch.tofile(f)
+            n_calls += len(batch)
+            last_time = float(batch['time'][-1])
+    header = dict(meta, nodes=list(nodes), fleet=list(fleet), n_calls=n_calls, last_time=last_time,
+                  dtype=CALL_DTYPE.descr)
+    with open(f"{prefix}.json", "w") as f:
+        json.dump(header, f)
+    return header
+
+
+def read_header(prefix):
+    with open(f"{prefix}.json") as f:
+        return json.load(f)
+
+
+def read_calls(prefix):
+    # All calls as a read-only memory-mapped record array, nothing is loaded up front
+    if os.path.getsize(f"{prefix}.calls.bin") == 0:
+        return np.empty(0, dtype=CALL_DTYPE)
+    return np.memmap(f"{prefix}.calls.bin", dtype=CALL_DTYPE, mode='r')
+
+
+def iter_calls(prefix, start=0, stop=None, chunk_size=1 << 16):
+    # (patient_id, (node, patient_type, time)) in time order, the format of the
+    # patient_calls dicts, for CallSchedule(iter_calls(prefix), presorted=True)
+    nodes = read_header(prefix)['nodes']
+    calls = read_calls(prefix)
+    stop = len(calls) if stop is None else min(stop, len(calls))
+    for begin in range(start, stop, chunk_size):
+        batch = np.array(calls[begin:min(begin + chunk_size, stop)])
+        for offset, (t, node, patient_type) in enumerate(zip(batch['time'].tolist(), batch['node'].tolist(), batch['patient_type'].tolist())):
+            yield begin + offset + 1, (nodes[node], patient_type, t)
+
+
+def main(argv=None):
+    from create_graph import recreate_graph_from_file
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic call workload and fleet for load testing")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--out', default='scenario', help="output prefix: <out>.calls.bin and <out>.json")
+    parser.add_argument('--rate', type=float, default=1.0, help="calls per time unit (peak rate is rate * max(profile))")
+    parser.add_argument('--duration', type=float, default=None)
+    parser.add_argument('--calls', type=int, default=None, help="stop after this many calls")
+    parser.add_argument('--profile', default=None, help="comma-separated rate multipliers, one per period, repeated")
+    parser.add_argument('--period', type=float, default=60.0, help="length of one profile period")
+    parser.add_argument('--type-weight', action='append', default=[], metavar='TYPE=W',
+                        help="demand weight per node type, e.g. E=1 H=0.2 (default: E=1)")
+    parser.add_argument('--hotspot', nargs=4, type=float, action='append', default=[], metavar=('X', 'Y', 'SIGMA', 'STRENGTH'))
+    parser.add_argument('--weights-file', default=None, help="'node weight' lines, overrides --type-weight/--hotspot")
+    parser.add_argument('--assignments', default=None,
+                        help="hospital assignment file; only its patient nodes raise calls")
+    parser.add_argument('--fleet-size', type=int, default=5)
+    parser.add_argument('--stations', nargs='+', default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    weights = read_weights_file(args.weights_file) if args.weights_file else None
+    type_weights = {k: float(v) for k, v in (item.split('=') for item in args.type_weight)} or None
+    if args.assignments:
+        with open(args.assignments) as f:
+            next(f)  # Skip the header line
+            assigned = {line.split(' assigned to ')[0] for line in f if line.strip()}
+        if weights is None:
+            nodes, p = node_weights(G, type_weights, args.hotspot)
+            weights = dict(zip(nodes, p))
+        weights = {node: w for node, w in weights.items() if node in assigned}
+    profile = [float(v) for v in args.profile.split(',')] if args.profile else None
+
+    start = time.perf_counter()
+    nodes, chunks = generate_calls(G, args.rate, args.duration, args.calls, args.seed, profile, args.period,
+                                   type_weights, args.hotspot, weights)
+    fleet = fleet_config(G, args.fleet_size, args.stations)
+    header = write_scenario(args.out, nodes, chunks, fleet, graph_file=args.graph, rate=args.rate,
+                            profile=profile, period_length=args.period, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{header['n_calls']} calls over {header['last_time']:.1f} time units on {len(nodes)} demand nodes, "
+          f"{len(fleet)} ambulances, written to {args.out}.calls.bin in {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
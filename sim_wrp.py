@@ -1,20 +1,65 @@
+import argparse
 import heapq
 import networkx as nx
 import math
 from create_graph import recreate_graph_from_file
-import ast
+from path_cache import ShortestPathCache
+from routing import Router
+from hospital_distances import hospital_distance_table
+from call_schedule import CallSchedule
+from trace_sink import TextSink, RESULTS, EVENTS
+from fleet_state import FleetState
+from nearest_ambulances import k_nearest_ambulances
+from batch_dispatch import process_queue_in_batch
+from station_mapping import read_station_mapping
+from event_simulation import run_event_simulation, AMBULANCE_FREE
 
 class AmbulanceDispatch:
-    def __init__(self, graph, ambulance_data):
+    def __init__(self, graph, ambulance_data, path_cache=None, trace=None, hospital_assignments=None, hospital_to_station=None, nearest_k=None, routing_engine=None, batch_dispatch=False, instrumentation=None, period_tables=None):
         self.graph = graph
+        # Where results, dispatch messages and positions go (see trace_sink.py for the other backends)
+        self.trace = trace if trace is not None else TextSink('results_wrp.txt')
+        # Shortest-path trees keyed by source node, can be shared between dispatchers on the same graph
+        # routing_engine (one of routing.ENGINES) swaps it for a Router, e.g. 'astar', 'ch' or 'csgraph' (SciPy)
+        if path_cache is None:
+            path_cache = Router(graph, engine=routing_engine) if routing_engine else ShortestPathCache(graph)
+        self.path_cache = path_cache
+        # Patient-to-hospital distances, built once per graph and shared by every dispatcher on it
+        self.hospital_table = hospital_distance_table(graph)
+        # None: score every available ambulance. An int k: one search from the patient that stops at the k closest
+        self.nearest_k = nearest_k
+        # Drain the queue with one optimal ambulance x patient matching instead of greedy dispatches
+        self.batch_dispatch = batch_dispatch
         self.available_ambulances = ambulance_data
         self.unavailable_ambulances = {}
+        # Status and timing columns for the whole fleet, used for the vectorised availability checks
+        self.fleet = FleetState(graph, ambulance_data)
         self.priority_queue = []
         self.current_time = 0  # Track the current time for dispatches
         self.was_queue_processed = False  # Track whether the queue was processed
-        self.hospital_to_station = read_ambulance_station_assignments('hospital_to_station_mapping.txt')
+        if hospital_to_station is None:
+            hospital_to_station = read_ambulance_station_assignments('hospital_to_station_mapping.txt')
+        self.hospital_to_station = hospital_to_station
+        # Emergency node -> assigned hospital, as written by generate_hospital_assignments.py
+        if hospital_assignments is None:
+            hospital_assignments = read_hospital_assignments('hospital_assignments.txt')
+        self.hospital_assignments = hospital_assignments
+        # Phase timers and counters (instrumentation.py); None leaves every method unwrapped
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            instrumentation.attach(self)
+        # Time-of-day travel times (travel_profiles.PeriodTables): graph, paths and assignments follow current_time
+        self.period_tables = period_tables
+        if period_tables is not None:
+            period_tables.attach(self)
 
     def find_nearby_ambulances(self, patient_node, radius=float('inf')):
+        if self.nearest_k is not None:
+            ambulance_nodes = {ambulance_id: data[2] for ambulance_id, data in self.available_ambulances.items()}
+            found = k_nearest_ambulances(self.graph, patient_node, ambulance_nodes, k=self.nearest_k, radius=radius,
+                                         stats=self.instrumentation.counters if self.instrumentation else None)
+            return {ambulance_id: (node, distance) for ambulance_id, (node, distance, path) in found.items()}
+
         nearby_ambulances = {}
         min_distance = float('inf')
         nearest_ambulance_id = None
@@ -22,7 +67,7 @@ class AmbulanceDispatch:
         for ambulance_id, ambulance_data in self.available_ambulances.items():
             ambulance_node=ambulance_data[2]
             try:
-                path_length = nx.dijkstra_path_length(self.graph, source=ambulance_node, target=patient_node, weight='weight')  # Assuming weights represent distance/time
+                path_length = self.path_cache.distance(ambulance_node, patient_node)  # Assuming weights represent distance/time
                 if path_length <= radius:
                     nearby_ambulances[ambulance_id] = (ambulance_node, path_length)
                 if path_length < min_distance:
@@ -40,54 +85,63 @@ class AmbulanceDispatch:
 
 
     def dispatch_ambulance(self, patient_call, hospital_node, patient_type, patient_id):
-        print('Printing patient call',patient_call,' id ',patient_id)
+        if self.trace.level >= EVENTS:
+            self.trace.event(f"Printing patient call {patient_call}  id  {patient_id}")
         patient_node=patient_call[0]
-        print(patient_node)
+        if self.trace.level >= EVENTS:
+            self.trace.event(patient_node)
         call_time=patient_call[2]
         #print(f"{self.current_time}: Attempting dispatch for patient {patient_id} at {patient_node}")
         self.update_available_ambulances()
 
-        if not self.available_ambulances:
-            print(f"{self.current_time}: No ambulances available, enqueued patient at {patient_node} with priority {self.determine_priority(patient_node, self.current_time)}")
-            heapq.heappush(self.priority_queue, (self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
+        if not self.fleet.free_count():
+            if self.trace.level >= EVENTS:
+                self.trace.event(f"{self.current_time}: No ambulances available, enqueued patient at {patient_node} with priority {self.determine_priority(patient_node, self.current_time)}")
+            self.queue_push((self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
             return
 
 
         nearby_ambulances = self.find_nearby_ambulances(patient_node)
         if not nearby_ambulances:
-            print(f"No nearby ambulances found; adding to queue")
-            heapq.heappush(self.priority_queue, (self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
+            if self.trace.level >= EVENTS:
+                self.trace.event(f"No nearby ambulances found; adding to queue")
+            self.queue_push((self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
             return
 
         best_ambulance_id, best_cost = self.select_best_ambulance(nearby_ambulances, patient_node, hospital_node)
         if best_ambulance_id is None:
-            print(f"Unable to find a suitable ambulance for dispatch; adding to queue")
-            heapq.heappush(self.priority_queue, (self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
+            if self.trace.level >= EVENTS:
+                self.trace.event(f"Unable to find a suitable ambulance for dispatch; adding to queue")
+            self.queue_push((self.determine_priority(patient_node, self.current_time), patient_call, hospital_node, patient_type, self.current_time,patient_id))
             return
         nearest_station_data = self.hospital_to_station[hospital_node]
         return_time = nearest_station_data['travel_time']
-        self.mark_ambulance_unavailable(best_ambulance_id, hospital_node, best_cost, patient_call, patient_id)
-        print(f"Ambulance {best_ambulance_id} dispatched to {patient_node} for patient {patient_id}, will be free at {self.current_time + best_cost}")
+        self.assign_ambulance(best_ambulance_id, patient_call, hospital_node, patient_id, best_cost)
+
+    def assign_ambulance(self, ambulance_id, patient_call, hospital_node, patient_id, best_cost):
+        self.mark_ambulance_unavailable(ambulance_id, hospital_node, best_cost, patient_call, patient_id)
+        if self.trace.level >= EVENTS:
+            self.trace.event(f"Ambulance {ambulance_id} dispatched to {patient_call[0]} for patient {patient_id}, will be free at {self.current_time + best_cost}")
 
     def update_available_ambulances(self):
         newly_available = []
-        for ambulance_id, info in list(self.unavailable_ambulances.items()):
-            if info['availability_time'] <= self.current_time:
-                newly_available.append(ambulance_id)
-                free=self.unavailable_ambulances[ambulance_id]
-                patient_id=free['patient_id']
-                response_time=free['availability_time']
-                call_time=free['call_time']
-                assignment_time=free['assignment_time']
-                f = open("results_wrp.txt", "a")
-                f.write(f"Patient {patient_id} called at time {call_time}, received an assignment at {assignment_time}, reached a hospital at {response_time}\n")
-                f.close()
-                hospital_location = info['hospital_location']  # Changed from 'hospital_location' to 'station_location'
-                self.available_ambulances[ambulance_id] = (hospital_location, hospital_location, hospital_location, info['path_to_station'],self.current_time)
-                del self.unavailable_ambulances[ambulance_id]
+        for ambulance_id in self.fleet.due(self.current_time):
+            info = self.unavailable_ambulances[ambulance_id]
+            newly_available.append(ambulance_id)
+            patient_id=info['patient_id']
+            response_time=info['availability_time']
+            call_time=info['call_time']
+            assignment_time=info['assignment_time']
+            if self.trace.level >= RESULTS:
+                self.trace.result(patient_id, call_time, assignment_time, response_time)
+            hospital_location = info['hospital_location']  # Changed from 'hospital_location' to 'station_location'
+            self.available_ambulances[ambulance_id] = (hospital_location, hospital_location, hospital_location, info['path_to_station'],self.current_time)
+            del self.unavailable_ambulances[ambulance_id]
+            self.fleet.release(ambulance_id, hospital_location)
 
         if newly_available:
-            print(self.current_time,f":Ambulances {newly_available} now available and stationed accordingly")
+            if self.trace.level >= EVENTS:
+                self.trace.event(f"{self.current_time} :Ambulances {newly_available} now available and stationed accordingly")
 
 
     def process_queued_requests(self):
@@ -95,13 +149,30 @@ class AmbulanceDispatch:
             #print(f"{self.current_time}: No processing required: No available ambulances or empty queue.")
             return
 
-        print(f"{self.current_time}: Processing queue. Queue Length: {len(self.priority_queue)}")
-        while self.priority_queue and self.available_ambulances:
-            priority, patient_call, hospital_node, patient_type, _,patient_id = heapq.heappop(self.priority_queue)
-            print(patient_call, " in process queued requests")
-            self.dispatch_ambulance(patient_call, hospital_node, patient_type,patient_id)
+        if self.trace.level >= EVENTS:
+            self.trace.event(f"{self.current_time}: Processing queue. Queue Length: {len(self.priority_queue)}")
+        if self.batch_dispatch:
+            # One fleet refresh and one assignment problem for every patient that can be served now
+            process_queue_in_batch(self)
+        else:
+            # One pass over the queue: a patient no ambulance can reach (e.g. after a
+            # road closure) goes back on it and must not be retried forever
+            for _ in range(len(self.priority_queue)):
+                if not self.fleet.free_count():
+                    break
+                priority, patient_call, hospital_node, patient_type, _,patient_id = self.queue_pop()
+                if self.trace.level >= EVENTS:
+                    self.trace.event(f"{patient_call}  in process queued requests")
+                self.dispatch_ambulance(patient_call, hospital_node, patient_type,patient_id)
+
+        if self.trace.level >= EVENTS:
+            self.trace.event(f"{self.current_time}: Remaining queue length: {len(self.priority_queue)}")
 
-        print(f"{self.current_time}: Remaining queue length: {len(self.priority_queue)}")
+    def queue_push(self, entry):
+        heapq.heappush(self.priority_queue, entry)
+
+    def queue_pop(self):
+        return heapq.heappop(self.priority_queue)
 
     def determine_priority(self, patient_node, time):
         return time  # Negative time to prioritize earlier requests
@@ -110,16 +181,17 @@ class AmbulanceDispatch:
         # Assume shortest path to patient plus path from patient to hospital determines best ambulance
         min_total_cost = float('inf')
         best_ambulance_id = None
+        try:
+            # Same for every candidate, so only the ambulance-to-patient leg is compared
+            cost_to_hospital = self.hospital_table.distance(patient_node, hospital_node)
+        except nx.NetworkXNoPath:
+            #print(f"No path from patient at node {patient_node} to hospital at node {hospital_node}")
+            return None, None
         for ambulance_id, (ambulance_node, cost_to_patient) in nearby_ambulances.items():
-            try:
-                cost_to_hospital = nx.dijkstra_path_length(self.graph, source=patient_node, target=hospital_node, weight='weight')
-                total_cost = cost_to_patient + cost_to_hospital
-                if total_cost < min_total_cost:
-                    min_total_cost = total_cost
-                    best_ambulance_id = ambulance_id
-            except nx.NetworkXNoPath:
-                pass
-                #print(f"No path from patient at node {patient_node} to hospital at node {hospital_node}")
+            total_cost = cost_to_patient + cost_to_hospital
+            if total_cost < min_total_cost:
+                min_total_cost = total_cost
+                best_ambulance_id = ambulance_id
 
         return best_ambulance_id, min_total_cost if best_ambulance_id else None
 
@@ -138,38 +210,51 @@ class AmbulanceDispatch:
             'patient_id':patient_id,
             'call_time':patient_call[2]
         }
+        self.fleet.assign(ambulance_id, self.available_ambulances[ambulance_id][2], self.current_time + best_cost, patient_id, hospital_node)
         del self.available_ambulances[ambulance_id]
 
     
     
-    def run_simulation(self, patient_calls):
-        # Determine the last call time to know when to stop processing new calls.
-        last_call_time = max(call[2] for id,call in patient_calls.items())+1000
+    def run_simulation(self, patient_calls, event_driven=False):
+        # patient_calls is a dict like the one in __main__ or a CallSchedule (possibly streamed)
+        call_schedule = patient_calls if isinstance(patient_calls, CallSchedule) else CallSchedule(patient_calls)
+        if event_driven:
+            # Jump from event to event instead of stepping one time unit at a time
+            run_event_simulation(self, call_schedule)
+            self.trace.flush()
+            return
 
         # Main simulation loop
-        while self.current_time <= last_call_time : #or not self.is_queue_empty()
+        while True:
             #print('running',self.current_time)
             # Process new or pending calls at the current time
-            self.process_calls_and_queue(patient_calls)
+            self.process_calls_and_queue(call_schedule)
             # Update the status of ambulances (e.g., make available ones that have completed their tasks)
             self.update_available_ambulances()
             # Try to dispatch any remaining queued requests
             self.process_queued_requests()
-            # Increment the simulation time only if more calls are expected or the queue is not empty
-            if self.current_time < last_call_time : #or not self.is_queue_empty()
-                self.current_time += 1
-            else:
-                break  # Break the loop if no more
+            # Keep running until 1000 time units after the last call
+            if call_schedule.peek_time() is None and (call_schedule.last_time is None or self.current_time + 1 > call_schedule.last_time + 1000):
+                break
+            self.current_time += 1
+        self.trace.flush()
+    def upcoming_fleet_events(self):
+        # Times at which the fleet changes state, used by the event-driven mode
+        next_free = self.fleet.next_free_time()
+        if next_free is not None:
+            yield next_free, AMBULANCE_FREE
     def is_queue_empty(self):
         # Check if there are no more requests in the priority queue
         return len(self.priority_queue) == 0
-    def process_calls_and_queue(self, patient_calls):
-        # Process all calls that are scheduled for the current time
-        for patient_id, call in patient_calls.items():
-            if call[2] == self.current_time:  # time is the third element in the tuple
-                patient_node, hospital_node, _ = call
-                hospital_node = assignments.get(patient_node, "Unknown")  # Get hospital node from assignments
-                self.dispatch_ambulance(call, hospital_node, _, patient_id)
+    def process_calls_and_queue(self, call_schedule):
+        # Process all calls that are due by the current time (times need not be whole ticks)
+        for patient_id, call in call_schedule.pop_due(self.current_time):
+            self.handle_call(patient_id, call)
+
+    def handle_call(self, patient_id, call):
+        patient_node, hospital_node, _ = call
+        hospital_node = self.hospital_assignments.get(patient_node, "Unknown")  # Get hospital node from assignments
+        self.dispatch_ambulance(call, hospital_node, _, patient_id)
 
        
 def read_hospital_assignments(assignment_file_path):
@@ -182,23 +267,19 @@ def read_hospital_assignments(assignment_file_path):
     return assignments
 
 def read_ambulance_station_assignments(file_path):
-    assignments = {}
-    with open(file_path, 'r') as f:
-        next(f)  # Skip the header line
-        for line in f:
-            hospital, data = line.strip().split(' assigned to ')
-            station, travel_details = data.split(', Travel Time: ')
-            travel_time, travel_path = travel_details.split(', path: ')
-            travel_path=ast.literal_eval(travel_path)
-            assignments[hospital] = {'station': station, 'travel_time': float(travel_time), 'travel_path':travel_path}
-    return assignments
+    # hospital_to_station_mapping.txt, or the .npz Ambulance_station_assignement.py saves next to it
+    return read_station_mapping(file_path)
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    argparse.ArgumentParser(description="Run the example simulation without the returning protocol (writes results_wrp.txt)").parse_args(argv)
+    from distance_cache import distance_cache  # Loads SciPy, so only when a simulation actually runs
+
     f = open("results_wrp.txt", "w")
     f.write(f"Without returning protocol\n")
     f.close()
     graph = recreate_graph_from_file('graph_structure.txt')
+    distance_cache(graph)  # Hospital trees from .distance_cache/ instead of recomputing them every run
     assignment_file_path = 'hospital_assignments.txt'
     assignments = read_hospital_assignments(assignment_file_path)
     ambulance_data = {
@@ -210,7 +291,7 @@ if __name__ == "__main__":
     
 }
     #ambulance id, hospital the ambulance went to, surrent loaction between ambulance and station, path from hospital to station
-    dispatcher = AmbulanceDispatch(graph, ambulance_data)
+    dispatcher = AmbulanceDispatch(graph, ambulance_data, hospital_assignments=assignments)
     patient_calls = {
     1: ('E28', 1, 5),       # Close to A210
     2: ('E8', 1, 30),       # Close to A211
@@ -247,3 +328,7 @@ if __name__ == "__main__":
 
 
     dispatcher.run_simulation(patient_calls)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+
+# hospital_to_station_mapping as arrays, so simulations load it without parsing
+# Python literals. Row r is hospitals[r] -> stations[r] with travel_time[r]; its
+# path is node_ids[path_nodes[path_ptr[r]:path_ptr[r + 1]]], hospital first.
+
+
+def save_station_mapping(file_path, assignments, travel_times, travel_paths):
+    # The three dicts returned by Ambulance_station_assignement.assign_stations_to_hospitals
+    hospitals = list(assignments)
+    stations = [assignments[hospital] for hospital in hospitals]
+    index = {}
+    path_nodes = []
+    path_ptr = [0]
+    for hospital, station in zip(hospitals, stations):
+        path_nodes.extend(index.setdefault(node, len(index)) for node in travel_paths[(hospital, station)])
+        path_ptr.append(len(path_nodes))
+    np.savez(file_path, hospitals=np.array(hospitals), stations=np.array(stations),
+             travel_time=np.array([travel_times[(s, h)] for h, s in zip(hospitals, stations)], dtype=np.float64),
+             node_ids=np.array(list(index)), path_ptr=np.array(path_ptr, dtype=np.int64),
+             path_nodes=np.array(path_nodes, dtype=np.int32))
+
+
+def load_station_mapping(file_path):
+    # {hospital: {'station', 'travel_time', 'travel_path'}}, the dict the dispatchers take
+    with np.load(file_path) as data:
+        node_ids = data['node_ids'].tolist()
+        path_ptr = data['path_ptr'].tolist()
+        path_nodes = data['path_nodes'].tolist()
+        return {
+            hospital: {'station': station, 'travel_time': travel_time,
+                       'travel_path': [node_ids[i] for i in path_nodes[path_ptr[r]:path_ptr[r + 1]]]}
+            for r, (hospital, station, travel_time) in enumerate(zip(
+                data['hospitals'].tolist(), data['stations'].tolist(), data['travel_time'].tolist()))
+        }
+
+
+def parse_station_mapping_text(file_path):
+    # The text format written by Ambulance_station_assignement.save_assignments_to_file.
+    # Paths are lists of plain node ids, split directly instead of evaluated.
+    assignments = {}
+    with open(file_path, 'r') as f:
+        next(f)  # Skip the header line
+        for line in f:
+            hospital, data = line.strip().split(' assigned to ')
+            station, travel_details = data.split(', Travel Time: ')
+            travel_time, travel_path = travel_details.split(', path: ')
+            travel_path = [node.strip().strip("'\"") for node in travel_path.strip('[]').split(',')]
+            assignments[hospital] = {'station': station, 'travel_time': float(travel_time), 'travel_path': travel_path}
+    return assignments
+
+
+def read_station_mapping(file_path):
+    # A .npz directly. For a text file, the .npz written next to it when it is
+    # at least as new (it came from the same run), otherwise the text itself.
+    if file_path.endswith('.npz'):
+        return load_station_mapping(file_path)
+    npz_path = os.path.splitext(file_path)[0] + '.npz'
+    if os.path.exists(npz_path) and os.path.getmtime(npz_path) >= os.path.getmtime(file_path):
+        return load_station_mapping(npz_path)
+    return parse_station_mapping_text(file_path)
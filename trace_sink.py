@@ -0,0 +1,145 @@
+import os
+import sys
+import numpy as np
+
+# Verbosity levels. Callers check `sink.level >= EVENTS` before building a
+# message, so a disabled level costs one integer comparison and nothing else.
+OFF = 0
+RESULTS = 1  # One record per completed trip (the results_*.txt lines)
+EVENTS = 2  # Dispatch and queue messages that used to be printed
+POSITIONS = 3  # Every ambulance position on every fleet update
+
+RESULT_DTYPE = np.dtype([('patient_id', 'i8'), ('call_time', 'f8'), ('assignment_time', 'f8'), ('arrival_time', 'f8')])
+POSITION_DTYPE = np.dtype([('time', 'f8'), ('ambulance_id', 'i8'), ('x', 'f8'), ('y', 'f8')])
+
+
+class NullSink:
+    # Drops everything, for sweeps where only the final state matters
+    level = OFF
+
+    def result(self, patient_id, call_time, assignment_time, arrival_time):
+        pass
+
+    def event(self, message):
+        pass
+
+    def position(self, time, ambulance_id, position):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TextSink:
+    # The original text logs, buffered and written in batches instead of
+    # opening the file once per line.
+    def __init__(self, results_path, positions_path=None, stream=sys.stdout, level=POSITIONS, buffer_size=1000):
+        self.results_path = results_path
+        self.positions_path = positions_path
+        self.stream = stream
+        self.level = level
+        self.buffer_size = buffer_size
+        self._results = []
+        self._events = []
+        self._positions = []
+
+    def result(self, patient_id, call_time, assignment_time, arrival_time):
+        self._results.append(f"Patient {patient_id} called at time {call_time}, received an assignment at {assignment_time}, reached a hospital at {arrival_time}\n")
+        self._maybe_flush(self._results)
+
+    def event(self, message):
+        if self.stream is not None:
+            self._events.append(f"{message}\n")
+            self._maybe_flush(self._events)
+
+    def position(self, time, ambulance_id, position):
+        if self.positions_path is not None:
+            self._positions.append(f"Time {time}: Ambulance {ambulance_id} at {position}\n")
+            self._maybe_flush(self._positions)
+
+    def _maybe_flush(self, buffer):
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._results:
+            with open(self.results_path, "a") as f:
+                f.writelines(self._results)
+            self._results.clear()
+        if self._positions:
+            with open(self.positions_path, "a") as f:
+                f.writelines(self._positions)
+            self._positions.clear()
+        if self._events:
+            self.stream.writelines(self._events)
+            self._events.clear()
+
+    def close(self):
+        self.flush()
+
+
+class ColumnarSink:
+    # Results and positions as NumPy record batches appended to raw binary files
+    # (<prefix>_results.bin, <prefix>_positions.bin), one chunk at a time. Event
+    # messages are free text and are not kept in this format. Pass prefix=None
+    # to keep the batches in memory and read them back with records().
+    def __init__(self, prefix, level=RESULTS, chunk_size=4096):
+        self.prefix = prefix
+        self.level = level
+        self.chunk_size = chunk_size
+        self._buffers = {'results': [], 'positions': []}
+        self._chunks = {'results': [], 'positions': []}  # Only used when prefix is None
+
+    def result(self, patient_id, call_time, assignment_time, arrival_time):
+        self._append('results', (patient_id, call_time, assignment_time, arrival_time))
+
+    def event(self, message):
+        pass
+
+    def position(self, time, ambulance_id, position):
+        x, y = position if isinstance(position, tuple) else (np.nan, np.nan)
+        self._append('positions', (time, ambulance_id, x, y))
+
+    def _append(self, kind, row):
+        buffer = self._buffers[kind]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self._flush_kind(kind)
+
+    def _flush_kind(self, kind):
+        buffer = self._buffers[kind]
+        if not buffer:
+            return
+        dtype = RESULT_DTYPE if kind == 'results' else POSITION_DTYPE
+        batch = np.array(buffer, dtype=dtype)
+        buffer.clear()
+        if self.prefix is None:
+            self._chunks[kind].append(batch)
+        else:
+            with open(f"{self.prefix}_{kind}.bin", "ab") as f:
+                batch.tofile(f)
+
+    def flush(self):
+        self._flush_kind('results')
+        self._flush_kind('positions')
+
+    def close(self):
+        self.flush()
+
+    def records(self, kind='results'):
+        # Everything written so far as one record array
+        self.flush()
+        dtype = RESULT_DTYPE if kind == 'results' else POSITION_DTYPE
+        if self.prefix is None:
+            chunks = self._chunks[kind]
+            return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+        file_path = f"{self.prefix}_{kind}.bin"
+        return read_columnar(file_path, kind) if os.path.exists(file_path) else np.empty(0, dtype=dtype)
+
+
+def read_columnar(file_path, kind='results'):
+    dtype = RESULT_DTYPE if kind == 'results' else POSITION_DTYPE
+    return np.fromfile(file_path, dtype=dtype)
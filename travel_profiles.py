@@ -0,0 +1,204 @@
+import argparse
+import random
+import time
+from functools import wraps
+
+import numpy as np
+
+from incremental_assignment import FacilityAssignments
+from path_cache import ShortestPathCache
+from hospital_distances import hospital_distance_table
+from routing import Router
+
+# Time-of-day travel times. The edge weights of the graph files are free-flow
+# travel times; a profile file scales them per period of the day. It is one .npz:
+#   cycle          length of a day in simulation time units (e.g. 1440 minutes)
+#   period_starts  start of each period within the cycle, ascending, first 0
+#   speeds         (profiles, periods) speed relative to free flow, 1.0 = the file weight
+#   u, v, profile  edges that follow profile[k] instead of profile 0
+# so a city needs one row per road class, not one per road.
+DEFAULT_PROFILES = 'travel_profiles.npz'
+
+# Night, morning rush, midday, evening rush, evening (minutes of the day)
+RUSH_HOUR_PERIODS = (0, 420, 600, 1020, 1200)
+RUSH_HOUR_SPEEDS = (
+    (1.0, 1.0, 1.0, 1.0, 1.0),  # Side streets: free flow all day
+    (1.0, 0.6, 0.85, 0.55, 0.9),  # Arterials
+    (1.0, 0.4, 0.75, 0.35, 0.8),  # Congested corridors
+)
+
+
+class TravelProfiles:
+    def __init__(self, cycle, period_starts, speeds, edge_profiles=None):
+        self.cycle = int(cycle)
+        self.period_starts = [int(start) for start in period_starts]
+        if not self.period_starts or self.period_starts[0] != 0 or self.period_starts != sorted(self.period_starts):
+            raise ValueError("period_starts must be ascending and start at 0")
+        self.speeds = np.asarray(speeds, dtype=np.float32)
+        self.edge_profiles = dict(edge_profiles or {})  # (u, v) -> profile index, profile 0 when absent
+        # Period of every whole time unit of the cycle, so period_at is one array lookup
+        self._period_of = np.zeros(self.cycle, dtype=np.int16)
+        for period, start in enumerate(self.period_starts):
+            self._period_of[start:] = period
+
+    @property
+    def n_periods(self):
+        return len(self.period_starts)
+
+    def period_at(self, time):
+        return int(self._period_of[int(time) % self.cycle])
+
+    def free_flow(self, period):
+        # True when every profile in use runs at free-flow speed in this period
+        used = {0} | set(self.edge_profiles.values())
+        return all(self.speeds[profile, period] == 1.0 for profile in used)
+
+    def period_graph(self, graph, period, weight='weight'):
+        # Copy of graph with the travel times of the period. The copy starts
+        # without the base graph's caches (distance table, CSR copy, ...).
+        copy = graph.copy()
+        copy.graph.clear()
+        default = float(self.speeds[0, period])
+        for u, v, data in copy.edges(data=True):
+            profile = self.edge_profiles.get((u, v))
+            if profile is None and not copy.is_directed():
+                profile = self.edge_profiles.get((v, u))
+            speed = default if profile is None else float(self.speeds[profile, period])
+            data[weight] = graph[u][v][weight] / speed
+        return copy
+
+    def save(self, file_path):
+        edges = list(self.edge_profiles)
+        np.savez(file_path, cycle=self.cycle, period_starts=np.array(self.period_starts, dtype=np.int32),
+                 speeds=self.speeds, u=np.array([u for u, _ in edges]), v=np.array([v for _, v in edges]),
+                 profile=np.array([self.edge_profiles[edge] for edge in edges], dtype=np.uint8))
+
+    @classmethod
+    def load(cls, file_path):
+        with np.load(file_path) as data:
+            edge_profiles = dict(zip(zip(data['u'].tolist(), data['v'].tolist()), data['profile'].tolist()))
+            return cls(int(data['cycle']), data['period_starts'].tolist(), data['speeds'], edge_profiles)
+
+
+def rush_hour_profiles(graph, share=0.3, congested_share=0.1, seed=0):
+    # Synthetic rush hours: a random share of the roads are arterials, part of
+    # them congested corridors; everything else keeps free flow
+    rng = random.Random(seed)
+    edge_profiles = {}
+    for u, v in graph.edges():
+        draw = rng.random()
+        if draw < congested_share:
+            edge_profiles[(u, v)] = 2
+        elif draw < share:
+            edge_profiles[(u, v)] = 1
+    return TravelProfiles(1440, RUSH_HOUR_PERIODS, RUSH_HOUR_SPEEDS, edge_profiles)
+
+
+class PeriodTables:
+    # Everything a dispatcher reads from the graph, once per period: the graph
+    # with that period's travel times, a path cache, the hospital distance table,
+    # the nearest hospital of every patient and the nearest station of every
+    # hospital. Built up front by attach(), so switching period during a run is
+    # a handful of attribute assignments. Free-flow periods share the
+    # dispatcher's own objects. With a cache_dir the hospital and station trees
+    # come from the persistent distance cache, one hash directory per period
+    # graph (see precompute()).
+    # A route keeps the travel times of the period it started in.
+    SWAPPED = ('graph', 'path_cache', 'hospital_table', 'hospital_assignments', 'hospital_to_station')
+    SYNCED = ('handle_call', 'update_available_ambulances', 'process_queued_requests')
+
+    def __init__(self, profiles, cache_dir=None):
+        self.profiles = profiles
+        self.cache_dir = cache_dir
+        self.tables = []  # Period -> {dispatcher attribute: value}
+        self.period = None
+
+    def attach(self, dispatcher):
+        base = {name: getattr(dispatcher, name) for name in self.SWAPPED}
+        self.tables = [base if self.profiles.free_flow(period) else self._build(base, period)
+                       for period in range(self.profiles.n_periods)]
+        for name in self.SYNCED:
+            setattr(dispatcher, name, self._synced(dispatcher, getattr(dispatcher, name)))
+        self.sync(dispatcher)
+
+    def _build(self, base, period):
+        graph = self.profiles.period_graph(base['graph'], period)
+        if self.cache_dir is not None:
+            from distance_cache import distance_cache
+            distance_cache(graph, self.cache_dir)  # Picked up by the table and the csgraph engine
+        hospital_table = hospital_distance_table(graph)
+        path_cache = base['path_cache']
+        if isinstance(path_cache, Router):
+            path_cache = Router(graph, engine=path_cache.engine)
+        else:
+            path_cache = ShortestPathCache(graph, path_cache.maxsize)
+        assignments = FacilityAssignments(graph)
+        hospital_to_station = {
+            hospital: {'station': station, 'travel_time': travel_time, 'travel_path': travel_path}
+            for hospital, (station, travel_time, travel_path) in assignments.station_mapping().items()
+        }
+        return {'graph': graph, 'path_cache': path_cache, 'hospital_table': hospital_table,
+                'hospital_assignments': assignments.hospital_assignments(), 'hospital_to_station': hospital_to_station}
+
+    def sync(self, dispatcher):
+        period = self.profiles.period_at(dispatcher.current_time)
+        if period != self.period:
+            self.period = period
+            for name, value in self.tables[period].items():
+                setattr(dispatcher, name, value)
+
+    def _synced(self, dispatcher, method):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            self.sync(dispatcher)
+            return method(*args, **kwargs)
+        return wrapper
+
+
+def precompute(graph, profiles, cache_dir):
+    # Hospital and station trees of every congested period, written to the
+    # persistent distance cache so simulations only memory-map them
+    from distance_cache import distance_cache
+
+    counts = []
+    for period in range(profiles.n_periods):
+        if profiles.free_flow(period):
+            period_graph = graph
+        else:
+            period_graph = profiles.period_graph(graph, period)
+        cache = distance_cache(period_graph, cache_dir)
+        cache.hospitals()
+        cache.stations()
+        counts.append((period, cache.misses, cache.directory))
+    return counts
+
+
+def main(argv=None):
+    from create_graph import recreate_graph_from_file
+    from distance_cache import DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Precompute per-period distance tables for time-of-day travel times")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--profiles', default=DEFAULT_PROFILES)
+    parser.add_argument('--generate', action='store_true',
+                        help="first write a synthetic rush-hour profile file for the graph to --profiles")
+    parser.add_argument('--share', type=float, default=0.3, help="share of roads slowed down at rush hour (--generate)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args(argv)
+
+    G = recreate_graph_from_file(args.graph)
+    if args.generate:
+        rush_hour_profiles(G, share=args.share, seed=args.seed).save(args.profiles)
+        print(f"Rush-hour profiles written to {args.profiles}")
+    profiles = TravelProfiles.load(args.profiles)
+    start = time.perf_counter()
+    for period, computed, directory in precompute(G, profiles, args.cache_dir):
+        state = "free flow" if profiles.free_flow(period) else "congested"
+        print(f"period {period} (from {profiles.period_starts[period]}, {state}): "
+              f"{'computed' if computed else 'cached'} in {directory}")
+    print(f"{profiles.n_periods} periods ready in {time.perf_counter() - start:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import heapq
+import itertools
+
+import numpy as np
+
+
+class VoronoiPartition:
+    # Network Voronoi partition: for every node, its nearest facility (hospital
+    # or station), the distance to it and the next hop on the way there, from one
+    # multi-source Dijkstra seeded with every facility. Distances are *to* the
+    # facility, so one-way roads are searched in reverse. Ties go to the facility
+    # listed first, the same choice as min(facilities, key=distance).
+    # add_facility, remove_facility, move_facility and update_edge repair the
+    # partition in place, touching only the cells that change, and return the
+    # changed nodes.
+    def __init__(self, graph, facilities, weight='weight'):
+        self.graph = graph
+        self.weight = weight
+        self.rank = {}  # Facility -> tie-break rank, lower wins; kept when a facility moves
+        self.owner = {}  # Node -> nearest facility
+        self.cells = {}  # Facility -> set of nodes it owns
+        self.distance = {}  # Node -> distance to its facility
+        self.next_hop = {}  # Node -> next node towards its facility (absent at the facility itself)
+        self.settled = 0
+        for facility in facilities:
+            self.rank.setdefault(facility, len(self.rank))
+        self._search({facility: ((0, r), None) for facility, r in self.rank.items()})
+
+    @property
+    def facilities(self):
+        return sorted(self.rank, key=self.rank.get)
+
+    def _label(self, node):
+        owner = self.owner.get(node)
+        return (float('inf'), float('inf')) if owner is None else (self.distance[node], self.rank[owner])
+
+    def _search(self, seeds):
+        # Dijkstra over (distance, rank) labels from seeds {node: (label, next hop)}.
+        # A node is only updated when it gets a strictly better label than it has,
+        # so the same loop builds a fresh partition and repairs one in place.
+        # Returns the updated nodes.
+        reverse = self.graph.reverse(copy=False) if self.graph.is_directed() else self.graph
+        by_rank = {r: facility for facility, r in self.rank.items()}
+        tentative = {}
+        counter = itertools.count()
+        heap = []
+        for node, (label, hop) in seeds.items():
+            if label < self._label(node):
+                tentative[node] = (label, hop)
+                heapq.heappush(heap, (label, next(counter), node))
+        done = set()
+        while heap:
+            label, _, node = heapq.heappop(heap)
+            if node in done or tentative[node][0] != label:
+                continue
+            done.add(node)
+            distance, r = label
+            previous = self.owner.get(node)
+            if previous is not None:
+                self.cells[previous].discard(node)
+            self.owner[node] = by_rank[r]
+            self.cells.setdefault(by_rank[r], set()).add(node)
+            self.distance[node] = distance
+            hop = tentative[node][1]
+            if hop is None:
+                self.next_hop.pop(node, None)
+            else:
+                self.next_hop[node] = hop
+            for neighbor, data in reverse[node].items():
+                new_label = (distance + data[self.weight], r)
+                if neighbor not in done and new_label < tentative.get(neighbor, (self._label(neighbor),))[0]:
+                    tentative[neighbor] = (new_label, node)
+                    heapq.heappush(heap, (new_label, next(counter), neighbor))
+        self.settled += len(done)
+        return done
+
+    def add_facility(self, facility, rank=None):
+        # New cell carved out of its neighbours: a search from the facility that
+        # stops wherever the existing label is already as good
+        if facility in self.rank:
+            raise ValueError(f"{facility} is already a facility")
+        self.rank[facility] = max(self.rank.values(), default=-1) + 1 if rank is None else rank
+        return self._search({facility: ((0, self.rank[facility]), None)})
+
+    def remove_facility(self, facility):
+        # The facility's cell is orphaned and refilled from its border with the
+        # remaining cells; nodes outside it keep their labels
+        if facility not in self.rank:
+            raise ValueError(f"{facility} is not a facility")
+        orphans = self.cells.pop(facility, set())
+        del self.rank[facility]
+        self._search(self._detach(orphans))
+        return orphans
+
+    def _detach(self, nodes):
+        # Drops the labels of nodes and returns the seeds that refill them from
+        # their neighbours outside the set
+        for node in nodes:
+            self.cells.get(self.owner.pop(node), set()).discard(node)
+            del self.distance[node]
+            self.next_hop.pop(node, None)
+        seeds = {}
+        for node in nodes:
+            best = ((float('inf'), float('inf')), None)
+            for neighbor, data in self.graph[node].items():
+                if neighbor in self.owner:
+                    label = (self.distance[neighbor] + data[self.weight], self.rank[self.owner[neighbor]])
+                    if label < best[0]:
+                        best = (label, neighbor)
+            if best[1] is not None:
+                seeds[node] = best
+        return seeds
+
+    def _subtree(self, root):
+        # root and every node of its cell whose next hops lead through it
+        children = {}
+        for node in self.cells[self.owner[root]]:
+            if node in self.next_hop:
+                children.setdefault(self.next_hop[node], []).append(node)
+        subtree = {root}
+        stack = [root]
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                subtree.add(child)
+                stack.append(child)
+        return subtree
+
+    def update_edge(self, u, v, weight=None):
+        # Repairs the partition after graph[u][v] changed (weight None: removed).
+        # Nodes routed over the edge lose their labels and are refilled from the
+        # border, as in remove_facility; a cheaper edge seeds the node it leaves
+        # from. Returns the changed nodes.
+        edges = [(u, v)] if self.graph.is_directed() else [(u, v), (v, u)]
+        orphans = set()
+        for node, hop in edges:
+            if node not in orphans and self.next_hop.get(node) == hop:
+                orphans |= self._subtree(node)
+        seeds = self._detach(orphans)
+        if weight is not None:
+            for node, hop in edges:
+                if hop in self.owner:
+                    label = (self.distance[hop] + weight, self.rank[self.owner[hop]])
+                    if node not in seeds or label < seeds[node][0]:
+                        seeds[node] = (label, hop)
+        return orphans | self._search(seeds)
+
+    def move_facility(self, old, new):
+        # Relocation keeps the facility's rank, so ties resolve as before
+        rank = self.rank[old] if old in self.rank else None
+        changed = self.remove_facility(old)
+        return changed | self.add_facility(new, rank)
+
+    def path(self, node):
+        # node -> ... -> its facility
+        path = [node]
+        while path[-1] in self.next_hop:
+            path.append(self.next_hop[path[-1]])
+        return path
+
+    def assignments(self, nodes=None):
+        # {node: facility} for the given nodes (default: every reachable node)
+        if nodes is None:
+            return dict(self.owner)
+        return {node: self.owner[node] for node in nodes if node in self.owner}
+
+    def save(self, file_path):
+        # Node-index arrays in one .npz: owner indexes facilities, next_hop indexes
+        # node_ids, -1 / inf mark unreachable nodes and the facilities themselves
+        node_ids = list(self.graph.nodes)
+        index = {node: i for i, node in enumerate(node_ids)}
+        facilities = self.facilities
+        rank = {facility: r for r, facility in enumerate(facilities)}
+        owner = np.full(len(node_ids), -1, dtype=np.int32)
+        distance = np.full(len(node_ids), np.inf)
+        next_hop = np.full(len(node_ids), -1, dtype=np.int32)
+        for node, facility in self.owner.items():
+            i = index[node]
+            owner[i] = rank[facility]
+            distance[i] = self.distance[node]
+            if node in self.next_hop:
+                next_hop[i] = index[self.next_hop[node]]
+        np.savez(file_path, node_ids=np.array(node_ids), facilities=np.array(facilities),
+                 owner=owner, distance=distance, next_hop=next_hop)
+
+    @classmethod
+    def load(cls, file_path, graph=None):
+        # A partition saved by save(); graph is only needed to update it later
+        with np.load(file_path) as data:
+            node_ids = data['node_ids'].tolist()
+            facilities = data['facilities'].tolist()
+            owner, distance, next_hop = data['owner'], data['distance'], data['next_hop']
+            reached = np.flatnonzero(owner >= 0).tolist()
+            hops = np.flatnonzero(next_hop >= 0).tolist()
+            partition = cls.__new__(cls)
+            partition.graph = graph
+            partition.weight = 'weight'
+            partition.rank = {facility: r for r, facility in enumerate(facilities)}
+            partition.owner = {node_ids[i]: facilities[r] for i, r in zip(reached, owner[reached].tolist())}
+            partition.cells = {}
+            for node, facility in partition.owner.items():
+                partition.cells.setdefault(facility, set()).add(node)
+            partition.distance = dict(zip((node_ids[i] for i in reached), distance[reached].tolist()))
+            partition.next_hop = {node_ids[i]: node_ids[j] for i, j in zip(hops, next_hop[hops].tolist())}
+            partition.settled = 0
+        return partition
+
+
+def hospital_partition(graph, weight='weight'):
+    # Voronoi partition of the graph around its hospitals ('H' nodes)
+    return VoronoiPartition(graph, [node for node in graph.nodes if node.startswith('H')], weight)